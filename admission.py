@@ -0,0 +1,179 @@
+# admission.py
+# Admission control for expensive route groups, so uploads, registrations and
+# geocoding can't starve cheap reads during a spike. Each RouteGroup gets:
+#   - a concurrency limit with a short bounded queue; when both are full (or a
+#     queued request waits too long) the request is shed with 503
+#   - a per-identity rate limit (token email, else client IP) in fixed windows;
+#     over the limit answers 429
+# Both carry Retry-After. Concurrency is per worker, since it guards this
+# worker's own event loop and threadpool; rate counters are shared through
+# Redis when ADMISSION_BACKEND=redis and fall back to in-memory if Redis fails.
+#
+# Every limit can be overridden per group from the environment, e.g.
+# ADMISSION_UPLOADS_CONCURRENCY=2 or ADMISSION_AUTH_RATE=10.
+import asyncio
+import json
+import math
+import os
+import re
+import threading
+import time
+from jose import jwt, JWTError
+from dotenv import load_dotenv
+from routes.dependencies import SECRET_KEY, ALGORITHM
+from metrics import admission_rejections
+
+load_dotenv()
+
+
+class RouteGroup:
+    def __init__(self, name: str, paths: list[str], methods: list[str] | None = None,
+                 concurrency: int = 8, queue: int = 16, queue_timeout: float = 2.0,
+                 rate: int | None = None, window: int = 60):
+        env = f"ADMISSION_{name.upper()}_"
+        self.name = name
+        self.patterns = [re.compile(p) for p in paths]
+        self.methods = {m.upper() for m in methods} if methods else None
+        self.concurrency = int(os.getenv(env + "CONCURRENCY", concurrency))
+        self.queue = int(os.getenv(env + "QUEUE", queue))
+        self.queue_timeout = float(os.getenv(env + "QUEUE_TIMEOUT", queue_timeout))
+        rate = os.getenv(env + "RATE", rate)
+        self.rate = int(rate) if rate else None
+        self.window = int(os.getenv(env + "WINDOW", window))
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._waiting = 0
+
+    def matches(self, method: str, path: str) -> bool:
+        if self.methods is not None and method not in self.methods:
+            return False
+        return any(p.match(path) for p in self.patterns)
+
+    async def acquire(self) -> bool:
+        """Take a slot, waiting in the queue if there is room; False means shed."""
+        if not self._slots.locked():
+            await self._slots.acquire()
+            return True
+        if self._waiting >= self.queue:
+            return False
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._waiting -= 1
+
+    def release(self):
+        self._slots.release()
+
+
+# ---------------- Rate counters ----------------
+class MemoryCounter:
+    def __init__(self):
+        self._counts: dict[str, tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    async def incr(self, key: str, window: int) -> int:
+        now = time.monotonic()
+        with self._lock:
+            expires, count = self._counts.get(key, (0.0, 0))
+            if expires <= now:
+                expires, count = now + window, 0
+                if len(self._counts) > 100_000:
+                    self._counts = {k: v for k, v in self._counts.items() if v[0] > now}
+            count += 1
+            self._counts[key] = (expires, count)
+            return count
+
+
+class RedisCounter:
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+        self._redis = redis.from_url(url)
+        self._fallback = MemoryCounter()
+
+    async def incr(self, key: str, window: int) -> int:
+        try:
+            pipe = self._redis.pipeline()
+            pipe.incr(key)
+            pipe.expire(key, window, nx=True)
+            count, _ = await pipe.execute()
+            return count
+        except Exception as e:
+            print("❌ Admission counter falling back to memory:", e)
+            return await self._fallback.incr(key, window)
+
+
+def _make_counter():
+    if os.getenv("ADMISSION_BACKEND", "memory") == "redis":
+        return RedisCounter(os.getenv("REDIS_URI", "redis://localhost:6379/0"))
+    return MemoryCounter()
+
+
+# ---------------- Middleware ----------------
+def client_identity(scope) -> str:
+    """Email from a valid bearer token, else the client's IP."""
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                try:
+                    email = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("email")
+                    if email:
+                        return f"user:{email}"
+                except JWTError:
+                    pass
+            break
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+async def _reject(send, status: int, detail: str, retry_after: int):
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(retry_after).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware; requests outside every group pass straight through."""
+
+    def __init__(self, app, groups: list[RouteGroup]):
+        self.app = app
+        self.groups = groups
+        self.counter = _make_counter()
+
+    def _group_for(self, scope) -> RouteGroup | None:
+        for group in self.groups:
+            if group.matches(scope["method"], scope["path"]):
+                return group
+        return None
+
+    async def __call__(self, scope, receive, send):
+        group = self._group_for(scope) if scope["type"] == "http" else None
+        if group is None:
+            return await self.app(scope, receive, send)
+
+        if group.rate:
+            window_index = int(time.time() // group.window)
+            key = f"admission:{group.name}:{client_identity(scope)}:{window_index}"
+            if await self.counter.incr(key, group.window) > group.rate:
+                retry_after = math.ceil((window_index + 1) * group.window - time.time())
+                admission_rejections.inc(group.name, 429)
+                return await _reject(send, 429, "Too many requests", max(retry_after, 1))
+
+        if not await group.acquire():
+            admission_rejections.inc(group.name, 503)
+            return await _reject(send, 503, "Server busy, try again shortly", max(math.ceil(group.queue_timeout), 1))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            group.release()
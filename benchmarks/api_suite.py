@@ -0,0 +1,316 @@
+# benchmarks/api_suite.py
+# End-to-end benchmark of the FastAPI app from main.py: seeds realistic volumes,
+# drives the hot flows concurrently through an in-process ASGI client and
+# records latency percentiles and throughput per flow.
+#
+#   local mongod (all flows):
+#     BENCH_MONGO_URL=mongodb://localhost:27017 python -m benchmarks.api_suite
+#   in-memory stand-in (needs benchmarks/requirements.txt; no $text, $geoNear
+#   or arrayFilters, so search_text/chat_send are skipped, and not thread-safe,
+#   so requests run one at a time):
+#     BENCH_MONGO=memory python -m benchmarks.api_suite
+#
+# Cloudinary, SMTP and Nominatim are faked (local storage, console mail, an
+# httpx MockTransport). Results go to benchmarks/results/<time>-<commit>.json
+# (git-ignored) and are compared with the previous run; --compare picks a
+# specific baseline.
+#
+# Tunables: BENCH_PROPERTIES (100k with mongod, 10k in memory), BENCH_CHATS,
+# BENCH_CHAT_MESSAGES, BENCH_CART_ITEMS, BENCH_REQUESTS, BENCH_CONCURRENCY,
+# BENCH_REGRESSION_PCT, BCRYPT_ROUNDS.
+import argparse
+import asyncio
+import glob
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+MEMORY = os.getenv("BENCH_MONGO", "mongod") == "memory"
+N_PROPERTIES = int(os.getenv("BENCH_PROPERTIES", 10_000 if MEMORY else 100_000))
+N_CHATS = int(os.getenv("BENCH_CHATS", 200))
+N_CHAT_MESSAGES = int(os.getenv("BENCH_CHAT_MESSAGES", 5_000))
+N_CART_ITEMS = int(os.getenv("BENCH_CART_ITEMS", 200))
+N_REQUESTS = int(os.getenv("BENCH_REQUESTS", 300))
+CONCURRENCY = 1 if MEMORY else int(os.getenv("BENCH_CONCURRENCY", 16))
+REGRESSION_PCT = float(os.getenv("BENCH_REGRESSION_PCT", 10))
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+PASSWORD = "bench-password"
+OWNER = "owner0@bench-estateuro.com"
+BUYER = "buyer@bench-estateuro.com"
+
+WORDS = ["sea", "view", "villa", "green", "garden", "city", "apartment", "metro", "lake", "hill",
+         "plot", "farm", "modern", "luxury", "cozy", "studio", "penthouse", "river", "park", "sunny"]
+CATEGORIES = ["house", "villa", "apartment", "farmlands", "plots", "buildings"]
+
+
+# ---------------- Environment (before the app is imported) ----------------
+def configure_environment():
+    os.environ["MONGO_URL"] = os.getenv("BENCH_MONGO_URL", os.getenv("MONGO_URL", "mongodb://localhost:27017"))
+    os.environ.setdefault("STORAGE_BACKEND", "local")
+    os.environ.setdefault("UPLOAD_DIR", tempfile.mkdtemp(prefix="bench-uploads-"))
+    os.environ.setdefault("EMAIL_TRANSPORT", "console")
+    os.environ.setdefault("GEOCODE_MIN_INTERVAL", "0")
+    os.environ.setdefault("RESPONSE_CACHE_BACKEND", "off")  # measure the query path, not the cache
+    os.environ.setdefault("MONGO_SLOW_MS", "1000000")
+    for group in ("UPLOADS", "AUTH", "GEOCODE", "EXPORT"):
+        os.environ.setdefault(f"ADMISSION_{group}_RATE", "100000000")
+        os.environ.setdefault(f"ADMISSION_{group}_QUEUE", "100000")
+        os.environ.setdefault(f"ADMISSION_{group}_QUEUE_TIMEOUT", "600")
+
+    if MEMORY:
+        import mongomock
+        import mongomock_motor
+        import pymongo
+        import motor.motor_asyncio
+        shared = mongomock.MongoClient()
+        pymongo.MongoClient = lambda *a, **k: shared
+        motor.motor_asyncio.AsyncIOMotorClient = (
+            lambda *a, **k: mongomock_motor.AsyncMongoMockClient(mock_mongo_client=shared)
+        )
+
+
+# ---------------- Seeding ----------------
+def seed(db):
+    from bson import ObjectId
+    from passwords import hash_password_sync
+    from routes.search import build_search_tokens
+    from routes.geo import geo_point
+    from routes.messages import new_member
+
+    for name in ("users", "properties", "chats", "chat_messages", "carts"):
+        db[name].delete_many({})
+
+    hashed = hash_password_sync(PASSWORD)
+    db.users.insert_many([
+        {"email": email, "fullName": email.split("@")[0], "password": hashed, "is_verified": True}
+        for email in (OWNER, BUYER)
+    ])
+
+    rng = random.Random(42)
+    base = datetime(2024, 1, 1)
+    property_ids, batch = [], []
+    for i in range(N_PROPERTIES):
+        title = " ".join(rng.sample(WORDS, 3))
+        description = " ".join(rng.choices(WORDS, k=40))
+        category = rng.choice(CATEGORIES)
+        lat, lng = 12.8 + rng.random() * 0.4, 77.4 + rng.random() * 0.4
+        oid = ObjectId()
+        property_ids.append(oid)
+        urls = [f"/uploads/{oid}-{k}.webp" for k in range(4)]
+        batch.append({
+            "_id": oid, "title": title, "description": description, "category": category,
+            "price": rng.randint(100_000, 30_000_000), "latitude": lat, "longitude": lng,
+            "geo": geo_point(lat, lng), "images": urls,
+            "image_variants": [{"full": u, "card": u, "thumb": u} for u in urls], "images_status": "ready",
+            "owner": OWNER if i % 50 == 0 else f"owner{i % 500}@bench-estateuro.com", "ownerFullName": "Bench Owner",
+            "mobileNO": "9999999999", "created_at": base + timedelta(minutes=i),
+            "search_tokens": build_search_tokens(title, description, category),
+        })
+        if len(batch) == 5000:
+            db.properties.insert_many(batch)
+            batch = []
+    if batch:
+        db.properties.insert_many(batch)
+
+    # the owner's inbox: many chats, one of them long
+    chat_ids, now = [], datetime.utcnow()
+    for c in range(N_CHATS):
+        chat_oid = ObjectId()
+        chat_ids.append(chat_oid)
+        count = N_CHAT_MESSAGES if c == 0 else 20
+        messages = [{
+            "_id": ObjectId(), "chatId": chat_oid, "seq": m + 1, "sender": BUYER if m % 2 else OWNER,
+            "text": f"message {m} " + " ".join(rng.choices(WORDS, k=8)),
+            "timestamp": (now - timedelta(seconds=count - m)).isoformat(),
+            "created_at": now - timedelta(seconds=count - m),
+        } for m in range(count)]
+        for start in range(0, len(messages), 5000):
+            db.chat_messages.insert_many(messages[start:start + 5000])
+        last = messages[-1]
+        db.chats.insert_one({
+            "_id": chat_oid, "propertyId": str(property_ids[c * 50 % len(property_ids)]),
+            "owner": OWNER, "buyer": BUYER, "seq": count,
+            "members": [{**new_member(OWNER), "unread": 3}, new_member(BUYER)],
+            "last_message": {"id": str(last["_id"]), "seq": last["seq"], "sender": last["sender"],
+                             "text": last["text"], "timestamp": last["timestamp"]},
+            "created_at": now - timedelta(days=1), "updated_at": now - timedelta(seconds=N_CHATS - c),
+        })
+
+    db.carts.insert_one({
+        "user": BUYER,
+        "items": [{"propertyId": str(pid)} for pid in rng.sample(property_ids, min(N_CART_ITEMS, len(property_ids)))],
+    })
+    return {"property_ids": [str(p) for p in property_ids], "chat_ids": [str(c) for c in chat_ids]}
+
+
+# ---------------- Flows ----------------
+# name -> (request builder, needs a real mongod)
+def build_flows(ctx):
+    rng = random.Random(7)
+    pid = lambda: rng.choice(ctx["property_ids"])
+    owner = {"Authorization": f"Bearer {ctx['owner_token']}"}
+    buyer = {"Authorization": f"Bearer {ctx['buyer_token']}"}
+    long_chat = ctx["chat_ids"][0]
+    return {
+        "login": (lambda c: c.post("/api/auth/login", json={"email": BUYER, "password": PASSWORD}), False),
+        "listing_recent": (lambda c: c.get("/api/properties", params={"limit": 20}), False),
+        "listing_category_price": (
+            lambda c: c.get(f"/api/category/{rng.choice(CATEGORIES)}", params={"sort": "price_asc", "limit": 20}),
+            False),
+        "listing_filter_facets": (lambda c: c.get("/api/properties/filter", params={
+            "category": rng.choice(CATEGORIES), "min_price": 1_000_000, "max_price": 10_000_000, "limit": 20,
+        }), False),
+        "property_detail": (lambda c: c.get(f"/api/property/{pid()}"), False),
+        "search_suggest": (lambda c: c.get("/api/search/suggest", params={"q": rng.choice(WORDS)[:3]}), False),
+        "search_text": (lambda c: c.get("/api/search", params={"q": " ".join(rng.sample(WORDS, 2))}), True),
+        "geocode": (lambda c: c.get("/api/search-location", params={"q": f"{rng.choice(WORDS)} {rng.randint(1, 50)}"}),
+                    False),
+        "cart_get": (lambda c: c.get("/api/cart", headers=buyer), False),
+        "cart_add": (lambda c: c.post(f"/api/cart/{pid()}", headers=buyer), False),
+        "chat_history": (lambda c: c.get(f"/api/chat/{long_chat}/messages", params={"limit": 50}, headers=buyer),
+                         False),
+        "chat_inbox": (lambda c: c.get("/api/chat/inbox", headers=owner), False),
+        "chat_send": (lambda c: c.post(f"/api/chat/{long_chat}/send", json={"text": "still available?"},
+                                       headers=buyer), True),
+    }
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def run_flow(client, request, total: int) -> dict:
+    latencies, errors = [], 0
+    queue = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for _ in queue:
+            start = time.perf_counter()
+            response = await request(client)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    ms = lambda v: round(v * 1000, 2)
+    return {
+        "requests": total, "errors": errors, "rps": round(total / elapsed, 1),
+        "p50_ms": ms(percentile(latencies, 50)), "p90_ms": ms(percentile(latencies, 90)),
+        "p99_ms": ms(percentile(latencies, 99)), "max_ms": ms(latencies[-1]),
+    }
+
+
+# ---------------- Results ----------------
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def save(result: dict) -> str:
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{result['meta']['commit']}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    return path
+
+
+def compare(current: dict, baseline: dict) -> list[str]:
+    """Print per-flow deltas; returns the flows whose p99 regressed past the threshold."""
+    regressions = []
+    print(f"\nvs {baseline['meta']['commit']} ({baseline['meta']['started_at']}):")
+    for name, now in current["flows"].items():
+        before = baseline["flows"].get(name)
+        if not before or not before.get("p99_ms"):
+            continue
+        delta = (now["p99_ms"] - before["p99_ms"]) / before["p99_ms"] * 100
+        flag = ""
+        if delta > REGRESSION_PCT:
+            flag = "  ❌ regression"
+            regressions.append(name)
+        print(f"  {name:<24} p99 {before['p99_ms']:>8} -> {now['p99_ms']:>8} ms ({delta:+6.1f}%)"
+              f"   rps {before['rps']:>8} -> {now['rps']:>8}{flag}")
+    return regressions
+
+
+async def main(selected: list[str] | None, baseline_path: str | None):
+    configure_environment()
+    import httpx
+    import main as app_module
+    from database import resources, MONGO_DB
+    from routes import location
+    from routes.auth import create_access_token_for_user
+
+    db = resources.client[MONGO_DB]
+    print(f"Seeding {N_PROPERTIES} properties, {N_CHATS} chats ({N_CHAT_MESSAGES} messages in the longest), "
+          f"{N_CART_ITEMS}-item cart ({'in-memory' if MEMORY else os.environ['MONGO_URL']})")
+    started = time.perf_counter()
+    ctx = seed(db)
+    ctx["owner_token"] = create_access_token_for_user(OWNER)
+    ctx["buyer_token"] = create_access_token_for_user(BUYER)
+    print(f"Seeded in {time.perf_counter() - started:.1f}s")
+
+    # fake Nominatim: answers instantly, never leaves the process
+    location._client = httpx.AsyncClient(transport=httpx.MockTransport(
+        lambda request: httpx.Response(200, json=[{"display_name": request.url.params["q"], "lat": "0", "lon": "0"}])
+    ))
+
+    flows = build_flows(ctx)
+    result = {
+        "meta": {
+            "commit": git_commit(), "started_at": datetime.now().isoformat(timespec="seconds"),
+            "mongo": "memory" if MEMORY else "mongod", "python": platform.python_version(),
+            "cpus": os.cpu_count(), "concurrency": CONCURRENCY, "properties": N_PROPERTIES,
+            "chat_messages": N_CHAT_MESSAGES, "cart_items": N_CART_ITEMS,
+        },
+        "flows": {},
+    }
+    async with app_module.app.router.lifespan_context(app_module.app):
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for name, (request, needs_server) in flows.items():
+                if selected and name not in selected:
+                    continue
+                if needs_server and MEMORY:
+                    print(f"{name:<24} skipped (needs a real mongod)")
+                    continue
+                total = max(CONCURRENCY, N_REQUESTS // 5) if name == "login" else N_REQUESTS
+                await run_flow(client, request, min(total, CONCURRENCY * 2))  # warm up
+                stats = await run_flow(client, request, total)
+                result["flows"][name] = stats
+                print(f"{name:<24} p50 {stats['p50_ms']:>8} ms  p90 {stats['p90_ms']:>8} ms  "
+                      f"p99 {stats['p99_ms']:>8} ms  {stats['rps']:>8} req/s  errors {stats['errors']}")
+
+    path = save(result)
+    print(f"\nSaved {path}")
+
+    if baseline_path is None:
+        previous = sorted(p for p in glob.glob(os.path.join(RESULTS_DIR, "*.json")) if p != path)
+        baseline_path = previous[-1] if previous else None
+    if baseline_path:
+        with open(baseline_path) as f:
+            if compare(result, json.load(f)):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--flows", help="comma-separated subset of flows to run")
+    parser.add_argument("--compare", help="result file to compare against (default: the previous run)")
+    args = parser.parse_args()
+    asyncio.run(main(args.flows.split(",") if args.flows else None, args.compare))
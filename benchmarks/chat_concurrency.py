@@ -0,0 +1,52 @@
+# benchmarks/chat_concurrency.py
+# Fires many concurrent requests at two otherwise identical `async def` routes:
+# one reads with blocking pymongo, the other awaits motor. Needs a local mongod:
+#   MONGO_URL=mongodb://localhost:27017 python -m benchmarks.chat_concurrency
+import asyncio
+import os
+import time
+import httpx
+from fastapi import FastAPI
+from database import db, async_db
+
+CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", 500))
+ROUNDS = int(os.getenv("BENCH_ROUNDS", 5))
+
+app = FastAPI()
+
+
+@app.get("/blocking/{chat_id}")
+async def blocking_read(chat_id: str):
+    chat = db.chats.find_one({"propertyId": chat_id}, {"_id": 0})
+    return chat or {}
+
+
+@app.get("/async/{chat_id}")
+async def async_read(chat_id: str):
+    chat = await async_db.chats.find_one({"propertyId": chat_id}, {"_id": 0})
+    return chat or {}
+
+
+async def run(kind: str) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(client.get(f"/{kind}/bench-{i % 50}") for i in range(CONCURRENCY)))
+        return time.perf_counter() - start
+
+
+async def main():
+    db.chats.delete_many({"propertyId": {"$regex": "^bench-"}})
+    db.chats.insert_many([
+        {"propertyId": f"bench-{i}", "owner": "o@x", "buyer": "b@x", "messages": []} for i in range(50)
+    ])
+    for kind in ("blocking", "async"):
+        await run(kind)  # warm up connections
+        best = min([await run(kind) for _ in range(ROUNDS)])
+        print(f"{kind:<9} {CONCURRENCY} concurrent requests: {best * 1000:8.1f} ms "
+              f"({CONCURRENCY / best:8.0f} req/s)")
+    db.chats.delete_many({"propertyId": {"$regex": "^bench-"}})
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,34 @@
+# benchmarks/login_throughput.py
+# Password verifications per second through passwords.verify_password, for a
+# range of pool sizes up to the machine's core count. No database needed:
+#   BCRYPT_ROUNDS=12 python -m benchmarks.login_throughput
+import asyncio
+import os
+import time
+import passwords
+
+LOGINS = int(os.getenv("BENCH_LOGINS", 64))
+
+
+async def run(workers: int, hashed: str) -> float:
+    passwords.shutdown_pool()
+    passwords.PASSWORD_HASH_WORKERS = workers
+    await passwords.verify_password("secret", hashed)  # start the pool outside the timing
+    start = time.perf_counter()
+    await asyncio.gather(*(passwords.verify_password("secret", hashed) for _ in range(LOGINS)))
+    return time.perf_counter() - start
+
+
+async def main():
+    hashed = passwords.hash_password_sync("secret")
+    cores = os.cpu_count() or 1
+    sizes = sorted({1, 2, max(1, cores // 2), cores})
+    print(f"bcrypt rounds={passwords.BCRYPT_ROUNDS}, {LOGINS} logins, {cores} cores")
+    for workers in sizes:
+        elapsed = await run(workers, hashed)
+        print(f"workers={workers:<3} {elapsed * 1000:9.1f} ms  ({LOGINS / elapsed:7.1f} logins/s)")
+    passwords.shutdown_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,78 @@
+# benchmarks/search_bench.py
+# Compares the old `$regex` title search with the indexed token search.
+# Needs a local mongod (the routes import database.py, so MONGO_URL must be set too):
+#   MONGO_URL=mongodb://localhost:27017 python -m benchmarks.search_bench
+import os
+import random
+import re
+import time
+from datetime import datetime, timedelta
+from pymongo import MongoClient, TEXT
+from routes.search import build_search_tokens, search_filter, TEXT_INDEX_WEIGHTS
+
+MONGO_URL = os.getenv("BENCH_MONGO_URL", os.getenv("MONGO_URL", "mongodb://localhost:27017"))
+N_DOCS = int(os.getenv("BENCH_DOCS", 100_000))
+ROUNDS = int(os.getenv("BENCH_ROUNDS", 50))
+
+WORDS = ["sea", "view", "villa", "green", "garden", "city", "apartment", "metro", "lake", "hill",
+         "plot", "farm", "modern", "luxury", "cozy", "studio", "penthouse", "river", "park", "sunny"]
+CATEGORIES = ["house", "villa", "apartment", "farmlands", "plots", "buildings"]
+QUERIES = ["vi", "vil", "villa", "sea vi", "green gard", "luxury pent", "riv"]
+
+
+def seed(coll):
+    coll.drop()
+    base = datetime(2024, 1, 1)
+    batch = []
+    for i in range(N_DOCS):
+        title = " ".join(random.sample(WORDS, 3))
+        description = " ".join(random.choices(WORDS, k=30))
+        category = random.choice(CATEGORIES)
+        batch.append({
+            "title": title, "description": description, "category": category,
+            "price": random.randint(10_000, 5_000_000),
+            "created_at": base + timedelta(minutes=i),
+            "search_tokens": build_search_tokens(title, description, category),
+        })
+        if len(batch) == 5000:
+            coll.insert_many(batch)
+            batch = []
+    if batch:
+        coll.insert_many(batch)
+    coll.create_index("search_tokens")
+    coll.create_index([("created_at", -1), ("_id", -1)])
+    coll.create_index([(f, TEXT) for f in TEXT_INDEX_WEIGHTS], weights=TEXT_INDEX_WEIGHTS)
+
+
+def timed(label, fn):
+    samples = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    p50 = samples[len(samples) // 2]
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{label:<28} p50 {p50:8.2f} ms   p95 {p95:8.2f} ms")
+
+
+def main():
+    coll = MongoClient(MONGO_URL)["realestate_bench"]["properties"]
+    print(f"seeding {N_DOCS} properties ...")
+    seed(coll)
+    sort = [("created_at", -1), ("_id", -1)]
+    for q in QUERIES:
+        print(f"\nquery {q!r}")
+        timed("regex (old)", lambda: list(
+            coll.find({"title": {"$regex": re.escape(q), "$options": "i"}}).sort(sort).limit(20)))
+        timed("search_tokens (prefix)", lambda: list(
+            coll.find(search_filter(q)).sort(sort).limit(20)))
+        timed("$text (ranked)", lambda: list(coll.aggregate([
+            {"$match": {"$text": {"$search": q}}},
+            {"$sort": {"score": {"$meta": "textScore"}, "_id": -1}},
+            {"$limit": 20},
+        ])))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# benchmarks/serialization_bench.py
+# Old vs new JSON path for a page of raw Mongo documents. No database needed:
+#   python -m benchmarks.serialization_bench
+#
+#   before: _id = str(...) per doc, jsonable_encoder, json.dumps (FastAPI default)
+#   after : serialization.dumps (orjson, ObjectId/datetime handled in one pass)
+#   ndjson: serialization.iter_ndjson over the same documents
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from serialization import dumps, iter_ndjson
+
+DOCS = int(os.getenv("BENCH_DOCS", 5000))
+ROUNDS = int(os.getenv("BENCH_ROUNDS", 5))
+
+
+def make_docs(n: int) -> list[dict]:
+    now = datetime.utcnow()
+    return [
+        {
+            "_id": ObjectId(),
+            "title": f"Sunny {i % 7}-bedroom villa near the lake",
+            "description": "Spacious, renovated, close to schools and transport. " * 4,
+            "price": 150_000 + i * 13.5,
+            "latitude": 12.9 + i * 1e-4,
+            "longitude": 77.5 + i * 1e-4,
+            "category": "villa",
+            "images": [f"https://cdn.example/{i}-{k}.webp" for k in range(4)],
+            "image_variants": [
+                {"full": f"https://cdn.example/{i}-{k}-full.webp", "card": f"https://cdn.example/{i}-{k}-card.webp",
+                 "thumb": f"https://cdn.example/{i}-{k}-thumb.webp"}
+                for k in range(4)
+            ],
+            "images_status": "ready",
+            "owner": f"owner{i % 50}@example.com",
+            "ownerFullName": "Owner Name",
+            "mobileNO": "9999999999",
+            "created_at": now - timedelta(minutes=i),
+        }
+        for i in range(n)
+    ]
+
+
+def before(docs: list[dict]) -> bytes:
+    for doc in docs:
+        doc["_id"] = str(doc["_id"])
+    content = jsonable_encoder({"items": docs, "next": None})
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+def after(docs: list[dict]) -> bytes:
+    return dumps({"items": docs, "next": None})
+
+
+def ndjson(docs: list[dict]) -> bytes:
+    return b"".join(iter_ndjson(docs))
+
+
+def best_of(fn) -> float:
+    timings = []
+    for _ in range(ROUNDS):
+        docs = make_docs(DOCS)  # fresh docs: before() mutates _id in place
+        start = time.perf_counter()
+        fn(docs)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    print(f"{DOCS} documents, best of {ROUNDS}")
+    base = best_of(before)
+    for name, fn in (("before", before), ("after", after), ("ndjson", ndjson)):
+        elapsed = base if fn is before else best_of(fn)
+        print(f"{name:<7} {elapsed * 1000:8.1f} ms  ({base / elapsed:5.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
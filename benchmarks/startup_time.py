@@ -0,0 +1,51 @@
+# benchmarks/startup_time.py
+# Cold import time of main.py (fresh interpreter each round) and, when a
+# mongod is reachable, lifespan startup time:
+#   python -m benchmarks.startup_time
+#   BENCH_MONGO_URL=mongodb://localhost:27017 python -m benchmarks.startup_time
+#
+# Import must not need any live service: MONGO_URL points at a closed port.
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROUNDS = int(os.getenv("BENCH_ROUNDS", 5))
+UNREACHABLE = "mongodb://127.0.0.1:1/?serverSelectionTimeoutMS=500"
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+
+
+def import_times() -> list[float]:
+    env = {**os.environ, "MONGO_URL": UNREACHABLE, "STORAGE_BACKEND": os.getenv("STORAGE_BACKEND", "cloudinary")}
+    timings = []
+    for _ in range(ROUNDS):
+        out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], env=env, capture_output=True, text=True)
+        if out.returncode != 0:
+            raise SystemExit(f"import main failed:\n{out.stderr}")
+        timings.append(float(out.stdout.strip().splitlines()[-1]))
+    return timings
+
+
+async def lifespan_time(url: str) -> float:
+    os.environ["MONGO_URL"] = url
+    import main
+    start = time.perf_counter()
+    async with main.app.router.lifespan_context(main.app):
+        elapsed = time.perf_counter() - start
+    return elapsed
+
+
+def main():
+    timings = import_times()
+    print(f"import main      median {statistics.median(timings) * 1000:7.1f} ms  "
+          f"(min {min(timings) * 1000:.1f}, {ROUNDS} fresh interpreters, no live services)")
+    url = os.getenv("BENCH_MONGO_URL")
+    if url:
+        print(f"lifespan startup        {asyncio.run(lifespan_time(url)) * 1000:7.1f} ms  ({url})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+# benchmarks/ws_idle_connections.py
+# Opens idle chat WebSockets against one running worker until it stops
+# accepting them, then checks a message still fans out to every socket.
+#   uvicorn main:app --workers 1 --port 8000 &
+#   BENCH_TOKEN=<access token> BENCH_CHAT_ID=<chat id> python -m benchmarks.ws_idle_connections
+# Raise the client's open-file limit first (ulimit -n 65536).
+import asyncio
+import os
+import time
+import httpx
+import websockets
+
+BASE_URL = os.getenv("BENCH_BASE_URL", "http://127.0.0.1:8000")
+TOKEN = os.environ["BENCH_TOKEN"]
+CHAT_ID = os.environ["BENCH_CHAT_ID"]
+TARGET = int(os.getenv("BENCH_CONNECTIONS", 10_000))
+BATCH = int(os.getenv("BENCH_BATCH", 200))
+
+
+async def main():
+    ws_url = BASE_URL.replace("http", "ws", 1) + f"/api/chat/{CHAT_ID}/ws?token={TOKEN}"
+    sockets = []
+    start = time.perf_counter()
+    try:
+        while len(sockets) < TARGET:
+            batch = await asyncio.gather(
+                *(websockets.connect(ws_url, open_timeout=10) for _ in range(BATCH)),
+                return_exceptions=True,
+            )
+            opened = [ws for ws in batch if not isinstance(ws, Exception)]
+            sockets += opened
+            if len(opened) < BATCH:
+                print(f"worker refused connections after {len(sockets)}: "
+                      f"{next(e for e in batch if isinstance(e, Exception))!r}")
+                break
+        elapsed = time.perf_counter() - start
+        print(f"{len(sockets)} idle connections open in {elapsed:.1f}s")
+
+        # one message should reach every idle socket
+        async with httpx.AsyncClient(base_url=BASE_URL) as client:
+            sent = time.perf_counter()
+            await client.post(f"/api/chat/{CHAT_ID}/send", json={"text": "fan-out probe"},
+                              headers={"Authorization": f"Bearer {TOKEN}"})
+        await asyncio.gather(*(ws.recv() for ws in sockets))
+        print(f"fan-out to {len(sockets)} sockets took {(time.perf_counter() - sent) * 1000:.0f} ms")
+    finally:
+        await asyncio.gather(*(ws.close() for ws in sockets), return_exceptions=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,159 @@
+# cleanup.py
+# Deleting a listing only moves it into `property_deletions` (a tombstone that
+# keeps a snapshot of the document) and removes it from `properties`, so every
+# read path stops seeing it at once. The slow cascade runs here afterwards:
+#   carts   - the id is pulled from every cart in one update_many
+#   chats   - chats and their chat_messages are removed in batches
+#   images  - remote files no other listing still uses are batch-deleted
+# Each step is idempotent and recorded in `steps_done`, so a retried job picks
+# up where it failed. Jobs run on a leased queue (leased_queue.py), like the
+# email outbox.
+import os
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from dotenv import load_dotenv
+from database import db
+from leased_queue import LeasedQueue, QueueWorker
+from storage import storage
+
+load_dotenv()
+
+CLEANUP_BATCH_SIZE = int(os.getenv("CLEANUP_BATCH_SIZE", 500))
+CLEANUP_POLL_SECONDS = float(os.getenv("CLEANUP_POLL_SECONDS", 30))
+CLEANUP_MAX_ATTEMPTS = int(os.getenv("CLEANUP_MAX_ATTEMPTS", 8))
+CLEANUP_BACKOFF_SECONDS = float(os.getenv("CLEANUP_BACKOFF_SECONDS", 30))
+CLEANUP_LEASE_SECONDS = 600
+# longer than any request takes between deduping a photo and saving its listing
+IMAGE_REUSE_GRACE = timedelta(minutes=10)
+
+STEPS = ("carts", "chats", "images")
+
+queue = LeasedQueue("property_deletions", CLEANUP_LEASE_SECONDS, CLEANUP_MAX_ATTEMPTS, CLEANUP_BACKOFF_SECONDS)
+
+
+# ---------- Enqueue ----------
+def soft_delete_property(prop: dict) -> dict:
+    """Tombstone `prop` and take it out of `properties`; returns the job."""
+    now = datetime.utcnow()
+    job = db.property_deletions.find_one_and_update(
+        {"_id": prop["_id"]},
+        {"$setOnInsert": {
+            "property": prop,
+            "owner": prop.get("owner"),
+            "status": "pending",
+            "attempts": 0,
+            "steps_done": [],
+            "progress": {"carts_updated": 0, "chats_deleted": 0, "messages_deleted": 0, "images_deleted": 0},
+            "next_attempt_at": now,
+            "created_at": now,
+        }},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    db.properties.delete_one({"_id": prop["_id"]})
+    worker.wake()
+    return job
+
+
+def job_status(job: dict) -> dict:
+    return {
+        "property_id": str(job["_id"]),
+        "status": job["status"],
+        "attempts": job.get("attempts", 0),
+        "steps_done": job.get("steps_done", []),
+        "progress": job.get("progress", {}),
+        "last_error": job.get("last_error"),
+        "next_attempt_at": job.get("next_attempt_at") if job["status"] == "pending" else None,
+        "created_at": job.get("created_at"),
+        "finished_at": job.get("finished_at"),
+    }
+
+
+# ---------- Steps ----------
+def _progress(job_id, **counts):
+    db.property_deletions.update_one({"_id": job_id}, {"$inc": {f"progress.{k}": v for k, v in counts.items()}})
+
+
+def purge_carts(job: dict):
+    pid = str(job["_id"])
+    result = db.carts.update_many({"items.propertyId": pid}, {"$pull": {"items": {"propertyId": pid}}})
+    _progress(job["_id"], carts_updated=result.modified_count)
+
+
+def purge_chats(job: dict):
+    pid = str(job["_id"])
+    while True:
+        chat_ids = [c["_id"] for c in db.chats.find({"propertyId": pid}, {"_id": 1}).limit(CLEANUP_BATCH_SIZE)]
+        if not chat_ids:
+            return
+        # messages first: a retry after a crash here still finds the chats
+        messages = db.chat_messages.delete_many({"chatId": {"$in": chat_ids}})
+        chats = db.chats.delete_many({"_id": {"$in": chat_ids}})
+        _progress(job["_id"], chats_deleted=chats.deleted_count, messages_deleted=messages.deleted_count)
+
+
+def purge_images(job: dict):
+    prop = job["property"]
+    variants = prop.get("image_variants") or [
+        {"full": url, "card": url, "thumb": url} for url in prop.get("images", [])
+    ]
+    fulls = [v["full"] for v in variants]
+    if not fulls:
+        return
+    # identical photos are stored once (image_pipeline), so another listing may share them
+    still_used = set(db.properties.distinct("images", {"images": {"$in": fulls}}))
+    orphans = [v for v in variants if v["full"] not in still_used]
+    if not orphans:
+        return
+    # forget the hash first so a new upload of the same photo re-uploads it;
+    # an asset handed out within the grace period stays, as its upload may not
+    # have written its listing yet
+    orphan_fulls = [v["full"] for v in orphans]
+    db.image_assets.delete_many({
+        "variants.full": {"$in": orphan_fulls},
+        "$or": [{"used_at": {"$lt": datetime.utcnow() - IMAGE_REUSE_GRACE}}, {"used_at": {"$exists": False}}],
+    })
+    # re-check now that no upload can dedupe against them any more
+    fresh = set(db.image_assets.distinct("variants.full", {"variants.full": {"$in": orphan_fulls}}))
+    referenced = set(db.properties.distinct("images", {"images": {"$in": orphan_fulls}}))
+    urls = list(dict.fromkeys(
+        url for v in orphans if v["full"] not in fresh | referenced for url in v.values()
+    ))
+    if urls:
+        _progress(job["_id"], images_deleted=storage.delete(urls))
+    if fresh - referenced:
+        # the step stays unfinished, so the job's backoff retries it
+        raise RuntimeError(f"{len(fresh - referenced)} photos were reused moments ago; checking again later")
+
+
+STEP_HANDLERS = {"carts": purge_carts, "chats": purge_chats, "images": purge_images}
+
+
+# ---------- Worker ----------
+def run_job(job: dict):
+    try:
+        for step in STEPS:
+            if step in job.get("steps_done", []):
+                continue
+            STEP_HANDLERS[step](job)
+            db.property_deletions.update_one({"_id": job["_id"]}, {"$addToSet": {"steps_done": step}})
+        queue.complete(job["_id"], unset=("last_error",))
+    except Exception as e:
+        attempts = queue.retry(job, e)
+        print(f"❌ Cleanup of property {job['_id']} failed (attempt {attempts}):", e)
+
+
+def run_due(limit: int = 10) -> int:
+    """Run one batch of due jobs; returns how many were claimed."""
+    jobs = queue.claim(limit)
+    for job in jobs:
+        run_job(job)
+    return len(jobs)
+
+
+class CleanupWorker(QueueWorker):
+    def run_batch(self) -> int:
+        return run_due(self.batch_size)
+
+
+worker = CleanupWorker("property-cleanup", CLEANUP_POLL_SECONDS, batch_size=10)
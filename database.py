@@ -1,20 +1,139 @@
 # database.py
+# One set of Mongo clients per process, created on first use rather than at
+# import, so modules (and tests) import without a live server and pre-fork
+# servers (gunicorn --preload, uvicorn --workers) never share a client across
+# a fork. main.py's lifespan calls resources.startup()/shutdown().
+#
+# Pool and timeout settings come from the environment:
+#   MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_MAX_IDLE_TIME_MS,
+#   MONGO_WAIT_QUEUE_TIMEOUT_MS, MONGO_SERVER_SELECTION_TIMEOUT_MS,
+#   MONGO_CONNECT_TIMEOUT_MS, MONGO_SOCKET_TIMEOUT_MS, MONGO_READ_PREFERENCE
 import os
+import threading
 from pymongo import MongoClient
 from dotenv import load_dotenv
+from metrics import mongo_listener
 
 load_dotenv()
 
-MONGO_URL = os.getenv("MONGO_URL")
-if not MONGO_URL:
-    raise RuntimeError("MONGO_URL environment variable is missing")
+MONGO_DB = os.getenv("MONGO_DB", "realestate")
 
-client = MongoClient(MONGO_URL)
-db = client["realestate"]
+_CLIENT_OPTIONS = {
+    "maxPoolSize": ("MONGO_MAX_POOL_SIZE", int),
+    "minPoolSize": ("MONGO_MIN_POOL_SIZE", int),
+    "maxIdleTimeMS": ("MONGO_MAX_IDLE_TIME_MS", int),
+    "waitQueueTimeoutMS": ("MONGO_WAIT_QUEUE_TIMEOUT_MS", int),
+    "serverSelectionTimeoutMS": ("MONGO_SERVER_SELECTION_TIMEOUT_MS", int),
+    "connectTimeoutMS": ("MONGO_CONNECT_TIMEOUT_MS", int),
+    "socketTimeoutMS": ("MONGO_SOCKET_TIMEOUT_MS", int),
+    "readPreference": ("MONGO_READ_PREFERENCE", str),
+}
 
-# Optional: test connection
-try:
-    client.admin.command("ping")
-    print("MongoDB connection successful ✅")
-except Exception as e:
-    raise RuntimeError(f"MongoDB connection failed: {e}")
+
+def client_options() -> dict:
+    options = {"event_listeners": [mongo_listener]}
+    for option, (env, cast) in _CLIENT_OPTIONS.items():
+        value = os.getenv(env)
+        if value:
+            options[option] = cast(value)
+    return options
+
+
+def _mongo_url() -> str:
+    url = os.getenv("MONGO_URL")
+    if not url:
+        raise RuntimeError("MONGO_URL environment variable is missing")
+    return url
+
+
+class Resources:
+    """Lazily created pymongo (sync routes, workers) and motor (async routes) clients."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._client = None
+        self._async_client = None
+        self.ready = False
+
+    def _check_fork(self):
+        # a client inherited from the parent process must not be reused
+        if self._pid != os.getpid():
+            self._client = None
+            self._async_client = None
+            self.ready = False
+            self._pid = os.getpid()
+
+    @property
+    def client(self) -> MongoClient:
+        client = self._client
+        if client is not None and self._pid == os.getpid():
+            return client
+        with self._lock:
+            self._check_fork()
+            if self._client is None:
+                self._client = MongoClient(_mongo_url(), **client_options())
+            return self._client
+
+    @property
+    def async_client(self):
+        client = self._async_client
+        if client is not None and self._pid == os.getpid():
+            return client
+        with self._lock:
+            self._check_fork()
+            if self._async_client is None:
+                from motor.motor_asyncio import AsyncIOMotorClient
+                self._async_client = AsyncIOMotorClient(_mongo_url(), **client_options())
+            return self._async_client
+
+    async def startup(self):
+        """Connect and verify the server is reachable; raises if it isn't."""
+        try:
+            await self.async_client.admin.command("ping")
+        except Exception as e:
+            raise RuntimeError(f"MongoDB connection failed: {e}")
+        self.ready = True
+        print("MongoDB connection successful ✅")
+
+    async def ping(self) -> bool:
+        try:
+            await self.async_client.admin.command("ping")
+            return True
+        except Exception:
+            return False
+
+    def shutdown(self):
+        with self._lock:
+            for client in (self._client, self._async_client):
+                if client is not None:
+                    client.close()
+            self._client = None
+            self._async_client = None
+            self.ready = False
+
+
+resources = Resources()
+
+
+class _LazyDatabase:
+    """Stands in for a Database object until first attribute access, so
+    `from database import db` keeps working without connecting at import."""
+
+    def __init__(self, get_client):
+        self._get_client = get_client
+
+    def _database(self):
+        return self._get_client()[MONGO_DB]
+
+    def __getattr__(self, name):
+        return getattr(self._database(), name)
+
+    def __getitem__(self, name):
+        return self._database()[name]
+
+
+db = _LazyDatabase(lambda: resources.client)
+# Non-blocking client for `async def` routes; never call `db` from those,
+# a pymongo round-trip there stalls the whole event loop.
+async_db = _LazyDatabase(lambda: resources.async_client)
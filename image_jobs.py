@@ -0,0 +1,120 @@
+# image_jobs.py
+# asyncImages uploads: the listing is published at once with images_status
+# "pending" and its photos are processed here afterwards. The uploaded bytes
+# are staged in `image_uploads` (one document per file) and the work runs on a
+# leased queue (leased_queue.py), so a worker restart only delays a job: its
+# lease runs out and another worker picks it up. A job that keeps failing
+# marks the listing "failed" instead of leaving it pending forever.
+import io
+import os
+from datetime import datetime
+from bson import Binary, ObjectId
+from fastapi import HTTPException
+from dotenv import load_dotenv
+from database import db
+from image_pipeline import store_images
+from leased_queue import LeasedQueue, QueueWorker
+from response_cache import invalidate
+
+load_dotenv()
+
+IMAGE_JOB_POLL_SECONDS = float(os.getenv("IMAGE_JOB_POLL_SECONDS", 5))
+IMAGE_JOB_MAX_ATTEMPTS = int(os.getenv("IMAGE_JOB_MAX_ATTEMPTS", 5))
+IMAGE_JOB_BACKOFF_SECONDS = float(os.getenv("IMAGE_JOB_BACKOFF_SECONDS", 10))
+IMAGE_JOB_LEASE_SECONDS = 300
+# staged files are single documents, so they must stay under Mongo's 16 MB limit
+IMAGE_UPLOAD_MAX_BYTES = int(os.getenv("IMAGE_UPLOAD_MAX_BYTES", 15 * 1024 * 1024))
+
+queue = LeasedQueue("image_jobs", IMAGE_JOB_LEASE_SECONDS, IMAGE_JOB_MAX_ATTEMPTS, IMAGE_JOB_BACKOFF_SECONDS)
+
+
+def _invalidate(property_oid: ObjectId, category: str):
+    invalidate(f"property:{property_oid}", "properties", f"category:{category}")
+
+
+# ---------- Enqueue ----------
+def stage_images(uploads) -> ObjectId:
+    """Copy `uploads` (UploadFiles) into `image_uploads`; returns the job id to
+    pass to enqueue_images. Done before the listing is written, so an oversized
+    file is refused up front."""
+    job_id = ObjectId()
+    for index, upload in enumerate(uploads):
+        data = upload.file.read(IMAGE_UPLOAD_MAX_BYTES + 1)
+        if len(data) > IMAGE_UPLOAD_MAX_BYTES:
+            db.image_uploads.delete_many({"job": job_id})
+            raise HTTPException(status_code=413, detail=f"Images are limited to {IMAGE_UPLOAD_MAX_BYTES} bytes")
+        db.image_uploads.insert_one({
+            "job": job_id,
+            "index": index,
+            "filename": upload.filename,
+            "data": Binary(data),
+            "created_at": datetime.utcnow(),
+        })
+    return job_id
+
+
+def enqueue_images(job_id: ObjectId, property_oid: ObjectId, category: str):
+    now = datetime.utcnow()
+    db.image_jobs.insert_one({
+        "_id": job_id,
+        "property": property_oid,
+        "category": category,
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now,
+    })
+    worker.wake()
+
+
+# ---------- Worker ----------
+def _attach(job: dict):
+    staged = db.image_uploads.find({"job": job["_id"]}).sort("index", 1)
+    variants = store_images([(io.BytesIO(f["data"]), f["filename"]) for f in staged])
+    db.properties.update_one(
+        {"_id": job["property"]},
+        {
+            "$addToSet": {
+                "images": {"$each": [v["full"] for v in variants]},
+                "image_variants": {"$each": variants},
+            },
+            "$set": {"images_status": "ready"},
+            "$unset": {"images_error": ""},
+        },
+    )
+
+
+def run_job(job: dict):
+    try:
+        # a listing deleted in the meantime needs no photos
+        if db.properties.count_documents({"_id": job["property"]}, limit=1):
+            _attach(job)
+        queue.complete(job["_id"], unset=("last_error",))
+        db.image_uploads.delete_many({"job": job["_id"]})
+        _invalidate(job["property"], job["category"])
+    except Exception as e:
+        attempts = queue.retry(job, e)
+        print(f"❌ Images for property {job['property']} failed (attempt {attempts}):", e)
+        if attempts >= IMAGE_JOB_MAX_ATTEMPTS:
+            db.properties.update_one(
+                {"_id": job["property"]},
+                {"$set": {"images_status": "failed", "images_error": str(e)}},
+            )
+            db.image_uploads.delete_many({"job": job["_id"]})
+            _invalidate(job["property"], job["category"])
+
+
+def run_due(limit: int = 4) -> int:
+    """Run one batch of due jobs; returns how many were claimed."""
+    jobs = queue.claim(limit)
+    for job in jobs:
+        run_job(job)
+    return len(jobs)
+
+
+class ImageWorker(QueueWorker):
+    def run_batch(self) -> int:
+        return run_due(self.batch_size)
+
+
+worker = ImageWorker("image-upload", IMAGE_JOB_POLL_SECONDS, batch_size=4)
@@ -0,0 +1,132 @@
+# image_pipeline.py
+# Normalizes listing photos before they reach storage: EXIF/metadata stripped,
+# oversized originals capped, everything re-encoded as WebP in three sizes.
+# Identical photos (same bytes) are stored once; image_assets maps the
+# content hash to the variant URLs already uploaded.
+import hashlib
+import io
+import os
+from datetime import datetime
+from PIL import Image, ImageOps, UnidentifiedImageError
+from pymongo import ReturnDocument
+from database import db
+from storage import storage, upload_pool
+
+IMAGE_FORMAT = "WEBP"
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", 82))
+
+# decoded size above which a photo is refused: a bitmap costs 3-4 bytes per
+# pixel in every upload thread, well before Pillow's own ~89 MP bomb check
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", 25_000_000))
+
+# variant name -> longest side in pixels
+VARIANTS = {
+    "full": int(os.getenv("IMAGE_MAX_SIDE", 2048)),
+    "card": 800,
+    "thumb": 320,
+}
+
+
+def render_variants(data: bytes) -> dict[str, bytes] | None:
+    """Re-encoded bytes per variant, or None if `data` isn't an image Pillow can read.
+
+    Raises ValueError for images over IMAGE_MAX_PIXELS, checked from the header
+    before any pixels are decoded.
+    """
+    try:
+        img = Image.open(io.BytesIO(data))
+        if img.format == "JPEG":
+            # decode at 1/2, 1/4 or 1/8 scale when that still covers the largest variant
+            img.draft(None, (VARIANTS["full"], VARIANTS["full"]))
+        width, height = img.size
+        if width * height > IMAGE_MAX_PIXELS:
+            raise ValueError(f"Image is {width}x{height}; at most {IMAGE_MAX_PIXELS} pixels are accepted")
+        img = ImageOps.exif_transpose(img)  # bake in rotation before EXIF is dropped
+    except Image.DecompressionBombError as e:
+        raise ValueError(str(e))
+    except (UnidentifiedImageError, OSError):
+        return None
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+
+    rendered = {}
+    for name, max_side in VARIANTS.items():
+        variant = img.copy()
+        variant.thumbnail((max_side, max_side), Image.LANCZOS)
+        out = io.BytesIO()
+        # no exif/icc arguments: the re-encoded file carries no metadata
+        variant.save(out, IMAGE_FORMAT, quality=IMAGE_QUALITY, method=4)
+        rendered[name] = out.getvalue()
+    return rendered
+
+
+def _store(data: bytes, digest: str, filename: str | None, allow_raw: bool = True) -> dict[str, str]:
+    # used_at tells cleanup (purge_images) that a listing may be about to
+    # reference these URLs, so it must not delete the files yet
+    known = db.image_assets.find_one_and_update(
+        {"_id": digest}, {"$set": {"used_at": datetime.utcnow()}}, projection={"variants": 1}
+    )
+    if known:
+        return known["variants"]
+
+    rendered = render_variants(data)
+    if rendered is None:
+        if not allow_raw:
+            raise ValueError("Not a decodable image")
+        # not a decodable image (e.g. a video); keep the original as every size
+        url = storage.save(io.BytesIO(data), filename)
+        variants = {name: url for name in VARIANTS}
+    else:
+        stem = digest[:16]
+        variants = {
+            name: storage.save(io.BytesIO(payload), f"{stem}-{name}.webp")
+            for name, payload in rendered.items()
+        }
+
+    # another worker may have stored the same photo meanwhile: whichever set
+    # reached image_assets first wins, and the loser's files are removed
+    winner = db.image_assets.find_one_and_update(
+        {"_id": digest},
+        {"$set": {"used_at": datetime.utcnow()}, "$setOnInsert": {"variants": variants, "created_at": datetime.utcnow()}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )["variants"]
+    if winner != variants:
+        storage.delete(list(set(variants.values())))
+    return winner
+
+
+def store_image(fileobj, filename: str | None = None) -> dict[str, str]:
+    """Normalize, dedupe and upload one photo; returns {"full", "card", "thumb"} URLs."""
+    data = fileobj.read()
+    return _store(data, hashlib.sha256(data).hexdigest(), filename)
+
+
+def variants_for_urls(urls: list[str]) -> list[dict]:
+    """Variant sets for already-stored images, in the order given. URLs from
+    before this pipeline existed map to themselves for every size."""
+    known = {
+        asset["variants"]["full"]: asset["variants"]
+        for asset in db.image_assets.find({"variants.full": {"$in": urls}}, {"variants": 1})
+    }
+    return [known.get(url, {name: url for name in VARIANTS}) for url in urls]
+
+
+def store_images(files: list[tuple], allow_raw: bool = True) -> list[dict]:
+    """Store (fileobj, filename) pairs concurrently on the shared
+    upload pool; results come back in input order. The same photo appearing
+    twice in one call is stored once.
+
+    allow_raw=False (for files fetched from URLs rather than uploaded by the
+    user) refuses anything Pillow can't decode instead of storing it as-is."""
+    if not files:
+        return []
+    unique: dict[str, tuple[bytes, str | None]] = {}
+    digests = []
+    for fileobj, filename in files:
+        data = fileobj.read()
+        digest = hashlib.sha256(data).hexdigest()
+        unique.setdefault(digest, (data, filename))
+        digests.append(digest)
+    stored = dict(zip(unique, upload_pool.map(lambda d: _store(unique[d][0], d, unique[d][1], allow_raw), unique)))
+    return [stored[d] for d in digests]
@@ -0,0 +1,154 @@
+# indexes.py
+# Every index the app relies on, created idempotently at startup.
+# Verify query plans with: python indexes.py --check
+import sys
+from datetime import datetime
+from bson import ObjectId
+from pymongo import IndexModel, ASCENDING, DESCENDING, TEXT, GEOSPHERE
+from pymongo.errors import OperationFailure
+from database import db
+from routes.search import TEXT_INDEX_WEIGHTS
+
+INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], unique=True),
+    ],
+    "properties": [
+        IndexModel([("owner", ASCENDING)]),
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("price", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("category", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("category", ASCENDING), ("price", ASCENDING), ("_id", ASCENDING)]),
+        # /properties/filter: category equality, then price and created_at ranges
+        IndexModel([("category", ASCENDING), ("price", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("price", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("search_tokens", ASCENDING)]),
+        IndexModel([(field, TEXT) for field in TEXT_INDEX_WEIGHTS],
+                   weights=TEXT_INDEX_WEIGHTS, name="properties_text"),
+        IndexModel([("geo", GEOSPHERE)]),
+        # bulk import upserts on the agency's own id; manual listings have none
+        IndexModel([("owner", ASCENDING), ("external_id", ASCENDING)], unique=True,
+                   partialFilterExpression={"external_id": {"$exists": True}}),
+        # import jobs find the listings whose images they still have to fetch
+        IndexModel([("import_job", ASCENDING), ("images_status", ASCENDING)],
+                   partialFilterExpression={"import_job": {"$exists": True}}),
+        # cleanup: is a deleted listing's photo still used by another listing?
+        IndexModel([("images", ASCENDING)]),
+    ],
+    "chats": [
+        IndexModel([("propertyId", ASCENDING)]),
+        IndexModel([("owner", ASCENDING), ("updated_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("members.email", ASCENDING), ("updated_at", DESCENDING), ("_id", DESCENDING)]),
+    ],
+    "chat_messages": [
+        IndexModel([("chatId", ASCENDING), ("seq", ASCENDING)]),
+    ],
+    "image_assets": [
+        # _id is the content hash; this finds variants for an existing URL
+        IndexModel([("variants.full", ASCENDING)]),
+    ],
+    "email_outbox": [
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)]),
+        # delivered mail is kept a week for debugging, then purged
+        IndexModel([("sent_at", ASCENDING)], expireAfterSeconds=7 * 24 * 3600),
+        # mail that expired unsent (stale OTPs) is purged a day after expiry
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=24 * 3600),
+    ],
+    "carts": [
+        IndexModel([("user", ASCENDING)], unique=True),
+        # cleanup: carts holding a deleted listing
+        IndexModel([("items.propertyId", ASCENDING)]),
+    ],
+    "import_jobs": [
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)]),
+        # finished imports (and their error reports) are kept 30 days
+        IndexModel([("finished_at", ASCENDING)], expireAfterSeconds=30 * 24 * 3600),
+    ],
+    "import_rows": [
+        IndexModel([("job", ASCENDING), ("row", ASCENDING)]),
+        # staged rows are deleted when their job ends; this catches abandoned uploads
+        IndexModel([("created_at", ASCENDING)], expireAfterSeconds=7 * 24 * 3600),
+    ],
+    "image_jobs": [
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)]),
+        # finished asyncImages jobs are kept a week
+        IndexModel([("finished_at", ASCENDING)], expireAfterSeconds=7 * 24 * 3600),
+    ],
+    "image_uploads": [
+        IndexModel([("job", ASCENDING), ("index", ASCENDING)]),
+        # staged files are deleted when their job ends; this catches abandoned uploads
+        IndexModel([("created_at", ASCENDING)], expireAfterSeconds=7 * 24 * 3600),
+    ],
+    "property_deletions": [
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)]),
+        # finished tombstones (with their listing snapshot) are kept 30 days
+        IndexModel([("finished_at", ASCENDING)], expireAfterSeconds=30 * 24 * 3600),
+    ],
+}
+
+# (label, collection, filter, sort) — the query each hot route actually runs
+CANONICAL_QUERIES = [
+    ("get_current_user", "users", {"email": "probe@example.com"}, None),
+    ("get_my_properties", "properties", {"owner": "probe@example.com"}, None),
+    ("get_all_properties", "properties", {}, [("created_at", -1), ("_id", -1)]),
+    ("get_all_properties?sort=price_asc", "properties", {}, [("price", 1), ("_id", 1)]),
+    ("get_properties_by_category", "properties", {"category": "villa"}, [("created_at", -1), ("_id", -1)]),
+    ("get_properties_by_category?sort=price_desc", "properties", {"category": "villa"},
+     [("price", -1), ("_id", -1)]),
+    ("filter_properties", "properties",
+     {"category": {"$in": ["villa", "house"]}, "price": {"$gte": 0, "$lte": 5_000_000}}, None),
+    ("filter_properties?price+date", "properties",
+     {"price": {"$gte": 0}, "created_at": {"$gte": datetime(2024, 1, 1)}}, None),
+    ("search_filter", "properties", {"search_tokens": {"$regex": "^vil"}}, [("created_at", -1), ("_id", -1)]),
+    ("get_or_create_chat", "chats", {"propertyId": "000000000000000000000000"}, None),
+    ("owner_inbox", "chats", {"owner": "probe@example.com"}, [("updated_at", -1), ("_id", -1)]),
+    ("buyer_inbox", "chats", {"members.email": "probe@example.com", "owner": {"$ne": "probe@example.com"}},
+     [("updated_at", -1), ("_id", -1)]),
+    ("get_chat_messages", "chat_messages", {"chatId": ObjectId("000000000000000000000000")}, [("seq", -1)]),
+    ("get_cart", "carts", {"user": "probe@example.com"}, None),
+    ("import_properties", "properties", {"owner": "probe@example.com", "external_id": {"$in": ["probe"]}}, None),
+    ("purge_carts", "carts", {"items.propertyId": "000000000000000000000000"}, None),
+    ("purge_images", "properties", {"images": {"$in": ["https://example.com/probe.webp"]}}, None),
+]
+
+
+def ensure_indexes(database=db):
+    for name, models in INDEXES.items():
+        try:
+            database[name].create_indexes(models)
+        except OperationFailure as e:
+            # e.g. duplicate emails blocking a unique index; keep serving
+            print(f"❌ Index creation failed on {name}: {e}")
+
+
+def _stages(plan: dict):
+    yield plan.get("stage")
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _stages(child)
+
+
+def check_query_plans(database=db) -> list[str]:
+    """Explain every canonical query; return the labels that fall back to COLLSCAN."""
+    failures = []
+    for label, collection, query, sort in CANONICAL_QUERIES:
+        cursor = database[collection].find(query).limit(1)
+        if sort:
+            cursor = cursor.sort(sort)
+        winning = cursor.explain()["queryPlanner"]["winningPlan"]
+        if "COLLSCAN" in _stages(winning):
+            failures.append(label)
+    return failures
+
+
+if __name__ == "__main__":
+    ensure_indexes()
+    if "--check" in sys.argv:
+        failed = check_query_plans()
+        for label in failed:
+            print(f"❌ COLLSCAN: {label}")
+        if failed:
+            sys.exit(1)
+        print("All canonical queries use an index ✅")
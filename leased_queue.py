@@ -0,0 +1,148 @@
+# leased_queue.py
+# Mongo-backed job queues with leases, shared by the email outbox, property
+# cleanup, feed imports and asyncImages uploads. A worker claims due documents
+# by atomically moving them to the claimed status with a `locked_until` lease;
+# a document whose worker died goes back to the queue when its lease runs out.
+# Failures are retried with exponential backoff until max_attempts, then
+# marked "failed".
+import threading
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from database import db
+
+
+class LeasedQueue:
+    def __init__(self, collection: str, lease_seconds: float, max_attempts: int, backoff_seconds: float,
+                 claimed: str = "running", done: str = "done", done_at: str = "finished_at"):
+        self.collection = collection
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.claimed = claimed
+        self.done = done
+        self.done_at = done_at
+
+    @property
+    def coll(self):
+        return db[self.collection]
+
+    def claim(self, limit: int) -> list[dict]:
+        """Atomically lease up to `limit` due documents to this worker."""
+        claimed = []
+        for _ in range(limit):
+            now = datetime.utcnow()
+            doc = self.coll.find_one_and_update(
+                {"$or": [
+                    {"status": "pending", "next_attempt_at": {"$lte": now}},
+                    {"status": self.claimed, "locked_until": {"$lte": now}},
+                ]},
+                {"$set": {"status": self.claimed, "locked_until": now + timedelta(seconds=self.lease_seconds)}},
+                sort=[("next_attempt_at", 1)],
+                return_document=ReturnDocument.AFTER,
+            )
+            if doc is None:
+                break
+            claimed.append(doc)
+        return claimed
+
+    def renew(self, doc_id):
+        """Extend the lease of a long-running job."""
+        self.coll.update_one(
+            {"_id": doc_id, "status": self.claimed},
+            {"$set": {"locked_until": datetime.utcnow() + timedelta(seconds=self.lease_seconds)}},
+        )
+
+    def release(self, doc_id):
+        """Hand a claimed job back to the queue untouched (e.g. on shutdown)."""
+        self.coll.update_one(
+            {"_id": doc_id, "status": self.claimed},
+            {"$set": {"status": "pending", "next_attempt_at": datetime.utcnow()}, "$unset": {"locked_until": ""}},
+        )
+
+    def complete(self, doc_id, status: str | None = None, unset: tuple[str, ...] = (), **fields):
+        self.coll.update_one(
+            {"_id": doc_id},
+            {"$set": {"status": status or self.done, self.done_at: datetime.utcnow(), **fields},
+             "$unset": {"locked_until": "", **{f: "" for f in unset}}},
+        )
+
+    def retry(self, doc: dict, error: Exception, permanent: bool = False) -> int:
+        """Reschedule `doc` with backoff (or fail it); returns the attempt count."""
+        attempts = doc.get("attempts", 0) + 1
+        failed = permanent or attempts >= self.max_attempts
+        delay = self.backoff_seconds * (2 ** (attempts - 1))
+        self.coll.update_one(
+            {"_id": doc["_id"]},
+            {
+                "$set": {
+                    "status": "failed" if failed else "pending",
+                    "attempts": attempts,
+                    "last_error": str(error),
+                    "next_attempt_at": datetime.utcnow() + timedelta(seconds=delay),
+                },
+                "$unset": {"locked_until": ""},
+            },
+        )
+        return attempts
+
+
+class QueueWorker:
+    """One background thread per process draining a queue. Subclasses implement
+    run_batch() (returns how many documents it claimed) and may open/close
+    resources in setup()/teardown(). The thread sleeps until wake() or the next
+    poll tick whenever a batch comes back short."""
+
+    def __init__(self, name: str, poll_seconds: float, batch_size: int):
+        self.name = name
+        self.poll_seconds = poll_seconds
+        self.batch_size = batch_size
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_batch(self) -> int:
+        raise NotImplementedError
+
+    def setup(self):
+        pass
+
+    def teardown(self):
+        pass
+
+    def wake(self):
+        self._wake.set()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def is_alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def stopping(self) -> bool:
+        return self._stop.is_set()
+
+    def stop(self, timeout: float = 10):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        self.setup()
+        try:
+            while not self._stop.is_set():
+                self._wake.clear()
+                try:
+                    claimed = self.run_batch()
+                except Exception as e:
+                    print(f"❌ {self.name} worker error:", e)
+                    claimed = 0
+                if claimed < self.batch_size:
+                    # queue drained: sleep until the next enqueue or poll tick
+                    self._wake.wait(self.poll_seconds)
+        finally:
+            self.teardown()
@@ -1,10 +1,84 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 
 # Import routers
-from routes import auth, property as property_routes, cart, location
+from routes import auth, property as property_routes, cart, location, search, geo, export, facets, imports
+from indexes import ensure_indexes, check_query_plans
+from storage import storage, LocalStorage
+from routes.email_utils import worker as email_worker
+from cleanup import worker as cleanup_worker
+from routes.imports import worker as import_worker
+from image_jobs import worker as image_worker
+from passwords import shutdown_pool as shutdown_password_pool
+from routes.location import close_client as close_geocoder_client
+from admission import AdmissionMiddleware, RouteGroup
+import response_cache
+from serialization import MongoJSONResponse
+from metrics import MetricsMiddleware, render as render_metrics
+from database import resources
 
-app = FastAPI(title="Real Estate Backend", version="1.0.0")
+READY_CHECK_TIMEOUT = float(os.getenv("READY_CHECK_TIMEOUT", 2))
+
+
+# ---------------- Startup ----------------
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # clients are created here, in the serving process, never at import time
+    await resources.startup()
+    await run_in_threadpool(ensure_indexes)
+    # INDEX_CHECK=1 refuses to start if a hot route would scan a whole collection
+    if os.getenv("INDEX_CHECK") == "1":
+        failed = await run_in_threadpool(check_query_plans)
+        if failed:
+            raise RuntimeError(f"COLLSCAN in canonical queries: {failed}")
+    email_worker.start()
+    cleanup_worker.start()
+    import_worker.start()
+    image_worker.start()
+    yield
+    image_worker.stop()
+    import_worker.stop()
+    cleanup_worker.stop()
+    email_worker.stop()
+    shutdown_password_pool()
+    await close_geocoder_client()
+    resources.shutdown()
+
+
+app = FastAPI(
+    title="Real Estate Backend",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=MongoJSONResponse,
+)
+
+# ---------------- Admission control ----------------
+# Limits for the expensive routes of each router below; ADMISSION_<NAME>_*
+# env vars override them. Added before CORS so rejections still carry CORS headers.
+admission_groups = [
+    # property router: image uploads
+    RouteGroup("uploads", [r"^/api/add-property$", r"^/api/property/[^/]+$"], methods=["POST", "PUT"],
+               concurrency=4, queue=8, queue_timeout=5, rate=20),
+    # auth router: bcrypt + OTP email
+    RouteGroup("auth", [r"^/api/auth/(register|login|resend-otp)$"], methods=["POST"],
+               concurrency=8, queue=32, queue_timeout=3, rate=10),
+    # location router: outbound geocoding
+    RouteGroup("geocode", [r"^/api/search-location$"], methods=["GET"],
+               concurrency=16, queue=64, queue_timeout=3, rate=60),
+    # imports router: feed uploads, each starting a long background job
+    RouteGroup("imports", [r"^/api/import/properties$"], methods=["POST"],
+               concurrency=2, queue=4, queue_timeout=5, rate=10),
+    # export router: long-running full-catalogue streams
+    RouteGroup("export", [r"^/api/export/"], methods=["GET"],
+               concurrency=2, queue=2, queue_timeout=1, rate=30),
+]
+app.add_middleware(AdmissionMiddleware, groups=admission_groups)
 
 # ---------------- CORS ----------------
 origins = [
@@ -20,13 +94,62 @@ app.add_middleware(
     allow_headers=["*"],          # all headers like Authorization
 )
 
+# ---------------- Metrics ----------------
+# outermost, so latency includes admission queueing and CORS
+app.add_middleware(MetricsMiddleware)
+
 # ---------------- Routers ----------------
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 app.include_router(property_routes.router, prefix="/api", tags=["property"])
 app.include_router(cart.cart_router, prefix="/api", tags=["cart"])
 app.include_router(location.router, prefix="/api", tags=["location"])
+app.include_router(search.router, prefix="/api", tags=["search"])
+app.include_router(geo.router, prefix="/api", tags=["geo"])
+app.include_router(facets.router, prefix="/api", tags=["search"])
+app.include_router(export.router, prefix="/api", tags=["export"])
+app.include_router(imports.router, prefix="/api", tags=["import"])
+
+# Local image storage (STORAGE_BACKEND=local) is served by the app itself
+if isinstance(storage, LocalStorage):
+    app.mount(storage.base_url, StaticFiles(directory=storage.directory), name="uploads")
 
 # ---------------- Root ----------------
 @app.get("/")
 def root():
     return {"message": "Backend running successfully ✅"}
+
+# Response cache hit/miss counters for this worker, for sizing RESPONSE_CACHE_SIZE/TTL
+@app.get("/cache-stats")
+def cache_stats():
+    return response_cache.snapshot()
+
+# Prometheus scrape endpoint (values are per worker process)
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+# ---------------- Health ----------------
+# liveness: the process is up and serving
+@app.get("/healthz")
+def healthz():
+    return {"status": "ok"}
+
+# readiness: dependencies answer, so the load balancer may send traffic
+@app.get("/readyz")
+async def readyz():
+    try:
+        mongo_ok = resources.ready and await asyncio.wait_for(resources.ping(), READY_CHECK_TIMEOUT)
+    except asyncio.TimeoutError:
+        mongo_ok = False
+    checks = {
+        "mongo": mongo_ok,
+        "email_worker": email_worker.is_alive(),
+        "cleanup_worker": cleanup_worker.is_alive(),
+        "import_worker": import_worker.is_alive(),
+        "image_worker": image_worker.is_alive(),
+    }
+    ready = all(checks.values())
+    return MongoJSONResponse(
+        {"status": "ready" if ready else "not ready", "checks": checks},
+        status_code=200 if ready else 503,
+    )
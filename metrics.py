@@ -0,0 +1,234 @@
+# metrics.py
+# In-process metrics rendered in the Prometheus text format at /metrics.
+#   - http_*      : per route template (MetricsMiddleware)
+#   - mongo_*     : per command/collection (MongoCommandMetrics, a pymongo listener)
+#   - outbound_*  : Cloudinary, SMTP and geocoder calls (timed())
+#
+# Values are per worker process; scrape each worker (or run one) to aggregate.
+# Kept free of app imports: database.py imports this module.
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pymongo import monitoring
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+MONGO_SLOW_MS = float(os.getenv("MONGO_SLOW_MS", 100))
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.extend(self._samples(labels, value))
+        return lines
+
+    def _samples(self, labels, value) -> list[str]:
+        return [f"{self.name}{_labels(self.labelnames, labels)} {value}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            counts = state[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def _samples(self, labels, state) -> list[str]:
+        counts, total, count = state
+        names = self.labelnames + ("le",)
+        lines, cumulative = [], 0
+        for bound, n in zip(self.buckets, counts):
+            cumulative += n
+            lines.append(f"{self.name}_bucket{_labels(names, labels + (bound,))} {cumulative}")
+        lines.append(f"{self.name}_bucket{_labels(names, labels + ('+Inf',))} {count}")
+        lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+        lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+REGISTRY: list[_Metric] = []
+# callables returning extra exposition lines (e.g. the response cache counters)
+COLLECTORS = []
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    for collect in COLLECTORS:
+        lines.extend(collect())
+    return "\n".join(lines) + "\n"
+
+
+# ---------------- Metrics ----------------
+http_requests = Counter("http_requests_total", "HTTP requests by route template and status.",
+                        ("method", "route", "status"))
+http_duration = Histogram("http_request_duration_seconds", "HTTP request latency by route template.",
+                          ("method", "route"))
+http_in_progress = Gauge("http_requests_in_progress", "HTTP requests currently being served.",
+                         ("method",))
+mongo_duration = Histogram("mongo_command_duration_seconds", "MongoDB command latency.",
+                           ("command", "collection"))
+mongo_failures = Counter("mongo_command_failures_total", "MongoDB commands that failed.",
+                         ("command", "collection"))
+outbound_duration = Histogram("outbound_request_duration_seconds", "Calls to external services.",
+                              ("service", "outcome"))
+admission_rejections = Counter("admission_rejections_total", "Requests shed by admission control.",
+                               ("group", "status"))
+
+
+@contextmanager
+def timed(service: str):
+    """Record an outbound call's duration under `service`, labelled ok/error."""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        outbound_duration.observe(time.perf_counter() - start, service, outcome)
+
+
+# ---------------- HTTP ----------------
+class MetricsMiddleware:
+    """Pure ASGI middleware. Labels use the matched route's path template
+    (e.g. /api/property/{property_id}), so label cardinality stays bounded.
+
+    rate(http_request_duration_seconds_sum[1m]) by route is the average number
+    of requests each route has in flight, i.e. its share of the worker."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_in_progress.inc(method)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_progress.dec(method)
+            # the router records the matched route in the (shared) scope
+            template = getattr(scope.get("route"), "path", None) or "unmatched"
+            http_requests.inc(method, template, status)
+            http_duration.observe(time.perf_counter() - start, method, template)
+
+
+# ---------------- MongoDB ----------------
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Times every command and logs the ones slower than MONGO_SLOW_MS."""
+
+    def __init__(self):
+        self._started = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(event):
+        return (event.connection_id, event.request_id)
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = "-"  # admin commands, getMore (cursor id), etc.
+        if event.command_name == "getMore":
+            collection = event.command.get("collection", "-")
+        with self._lock:
+            self._started[self._key(event)] = (collection, event.command)
+
+    def _finish(self, event, failed: bool):
+        with self._lock:
+            collection, command = self._started.pop(self._key(event), ("-", None))
+        seconds = event.duration_micros / 1_000_000
+        mongo_duration.observe(seconds, event.command_name, collection)
+        if failed:
+            mongo_failures.inc(event.command_name, collection)
+        if seconds * 1000 >= MONGO_SLOW_MS:
+            print(f"🐢 Slow Mongo {event.command_name} on {collection}: {seconds * 1000:.0f} ms "
+                  f"{_summarize(command)}")
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+
+def _summarize(command) -> str:
+    if not command:
+        return ""
+    shape = {k: command[k] for k in ("filter", "pipeline", "sort", "q", "limit") if k in command}
+    text = repr(shape)
+    return text if len(text) <= 500 else text[:500] + "…"
+
+
+mongo_listener = MongoCommandMetrics()
@@ -0,0 +1,147 @@
+# migrations.py
+# Idempotent data migrations. Run once per deploy with: python migrations.py
+from datetime import datetime
+from bson import ObjectId
+from pymongo import UpdateOne
+from database import db
+from indexes import ensure_indexes
+from routes.search import build_search_tokens
+
+BATCH_SIZE = 1000
+
+
+def backfill_geo_points():
+    # server-side pipeline update: no documents travel to the app
+    result = db.properties.update_many(
+        {
+            "geo": {"$exists": False},
+            "latitude": {"$type": "number", "$gte": -90, "$lte": 90},
+            "longitude": {"$type": "number", "$gte": -180, "$lte": 180},
+        },
+        [{"$set": {"geo": {"type": "Point", "coordinates": ["$longitude", "$latitude"]}}}],
+    )
+    print(f"geo backfilled on {result.modified_count} properties")
+
+
+def backfill_image_variants():
+    # photos uploaded before the image pipeline have one size: use it for all
+    result = db.properties.update_many(
+        {"image_variants": {"$exists": False}},
+        [{"$set": {"image_variants": {"$map": {
+            "input": {"$ifNull": ["$images", []]},
+            "in": {"full": "$$this", "card": "$$this", "thumb": "$$this"},
+        }}}}],
+    )
+    print(f"image_variants backfilled on {result.modified_count} properties")
+
+
+def backfill_search_tokens():
+    cursor = db.properties.find(
+        {"search_tokens": {"$exists": False}},
+        {"title": 1, "description": 1, "category": 1},
+    ).batch_size(BATCH_SIZE)
+
+    ops, total = [], 0
+    for prop in cursor:
+        tokens = build_search_tokens(prop.get("title"), prop.get("description"), prop.get("category"))
+        ops.append(UpdateOne({"_id": prop["_id"]}, {"$set": {"search_tokens": tokens}}))
+        if len(ops) >= BATCH_SIZE:
+            total += db.properties.bulk_write(ops, ordered=False).modified_count
+            ops = []
+    if ops:
+        total += db.properties.bulk_write(ops, ordered=False).modified_count
+    print(f"search_tokens backfilled on {total} properties")
+
+
+def migrate_embedded_messages():
+    """Move chats.messages arrays into the chat_messages collection."""
+    moved = 0
+    for chat in db.chats.find({"messages": {"$exists": True}}, {"messages": 1}).batch_size(100):
+        docs = []
+        for m in chat.get("messages") or []:
+            try:
+                created_at = datetime.fromisoformat(m["timestamp"])
+            except (KeyError, TypeError, ValueError):
+                created_at = datetime.utcnow()
+            # ObjectIds minted in sequence keep the original message order
+            docs.append({
+                "_id": ObjectId(),
+                "chatId": chat["_id"],
+                "sender": m.get("sender"),
+                "text": m.get("text", ""),
+                "timestamp": m.get("timestamp") or created_at.isoformat(),
+                "created_at": created_at,
+            })
+        update = {"$unset": {"messages": ""}}
+        if docs:
+            db.chat_messages.insert_many(docs, ordered=True)
+            last = docs[-1]
+            update["$set"] = {
+                "last_message": {
+                    "id": str(last["_id"]),
+                    "sender": last["sender"],
+                    "text": last["text"],
+                    "timestamp": last["timestamp"],
+                },
+                "updated_at": last["created_at"],
+            }
+        db.chats.update_one({"_id": chat["_id"]}, update)
+        moved += len(docs)
+    print(f"{moved} chat messages moved to chat_messages")
+
+
+def backfill_message_seq():
+    """Number older chat messages with the per-chat `seq` that pages use.
+
+    Messages without a seq predate it and come first, in _id order; any sent
+    by new code before this ran keep their relative order after them.
+    """
+    chat_ids = db.chat_messages.distinct("chatId", {"seq": {"$exists": False}})
+    for chat_id in chat_ids:
+        unnumbered = db.chat_messages.find({"chatId": chat_id, "seq": {"$exists": False}}, {"_id": 1}).sort("_id", 1)
+        numbered = db.chat_messages.find({"chatId": chat_id, "seq": {"$exists": True}}, {"_id": 1}).sort("seq", 1)
+        ids = [m["_id"] for m in unnumbered] + [m["_id"] for m in numbered]
+        for start in range(0, len(ids), BATCH_SIZE):
+            db.chat_messages.bulk_write([
+                UpdateOne({"_id": _id}, {"$set": {"seq": start + i + 1}})
+                for i, _id in enumerate(ids[start:start + BATCH_SIZE])
+            ], ordered=False)
+        db.chats.update_one({"_id": chat_id}, {"$max": {"seq": len(ids)}})
+        db.chats.update_one({"_id": chat_id, "last_message.id": str(ids[-1])}, {"$set": {"last_message.seq": len(ids)}})
+    print(f"message seq backfilled on {len(chat_ids)} chats")
+
+
+def backfill_chat_members():
+    """Give older chats a members list (read watermark + unread counter per person).
+
+    Unread counters start at "messages not sent by me", which is what the
+    inbox showed before watermarks existed; mark-read clears them.
+    """
+    updated = 0
+    for chat in db.chats.find({"members": {"$exists": False}}, {"owner": 1, "buyer": 1, "participants": 1, "updated_at": 1}):
+        emails = {chat.get("owner"), chat.get("buyer")} | set(chat.get("participants") or [])
+        emails |= set(db.chat_messages.distinct("sender", {"chatId": chat["_id"]}))
+        members = [
+            {
+                "email": email,
+                "unread": db.chat_messages.count_documents({"chatId": chat["_id"], "sender": {"$ne": email}}),
+                "last_read": None,
+            }
+            for email in sorted(e for e in emails if e)
+        ]
+        update = {"$set": {"members": members}, "$unset": {"participants": ""}}
+        if not chat.get("updated_at"):
+            update["$set"]["updated_at"] = chat["_id"].generation_time.replace(tzinfo=None)
+        db.chats.update_one({"_id": chat["_id"]}, update)
+        updated += 1
+    print(f"members backfilled on {updated} chats")
+
+
+if __name__ == "__main__":
+    backfill_search_tokens()
+    backfill_geo_points()
+    backfill_image_variants()
+    migrate_embedded_messages()
+    backfill_message_seq()
+    backfill_chat_members()
+    ensure_indexes()
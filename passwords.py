@@ -0,0 +1,75 @@
+# passwords.py
+# bcrypt runs on a dedicated process pool so a burst of logins can't starve the
+# event loop or the request threadpool. This module is imported by the pool's
+# child processes, so it must stay free of app imports (database, routes).
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from passlib.context import CryptContext
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+
+# min_rounds = rounds: hashes made at a lower cost count as deprecated and are
+# upgraded on the user's next successful login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+)
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    # created on first use, i.e. after uvicorn/gunicorn have forked the workers;
+    # spawn (not fork) because the app process already runs threads
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=PASSWORD_HASH_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+# ---------------- Run inside the pool ----------------
+def hash_password_sync(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def verify_and_update_sync(password: str, hashed: str) -> tuple[bool, str | None]:
+    return pwd_context.verify_and_update(password, hashed)
+
+
+# ---------------- Called from routes ----------------
+async def _run(fn, *args):
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_get_pool(), fn, *args)
+    except BrokenProcessPool:
+        # a child died (e.g. OOM-killed); replace the pool once and retry
+        shutdown_pool()
+        return await loop.run_in_executor(_get_pool(), fn, *args)
+
+
+async def hash_password(password: str) -> str:
+    return await _run(hash_password_sync, password)
+
+
+async def verify_password(password: str, hashed: str) -> tuple[bool, str | None]:
+    """(matches, new_hash); new_hash is set when the stored hash should be replaced."""
+    return await _run(verify_and_update_sync, password, hashed)
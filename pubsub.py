@@ -0,0 +1,90 @@
+# pubsub.py
+# Fan-out for real-time events (chat messages over WebSocket).
+#   PUBSUB_BACKEND=memory (default) - delivery within this worker only
+#   PUBSUB_BACKEND=redis            - publish through Redis (REDIS_URI) so every
+#                                     worker's subscribers receive the event
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class InProcessBroker:
+    def __init__(self):
+        self._channels: dict[str, set[asyncio.Queue]] = {}
+
+    async def publish(self, channel: str, message: dict):
+        self._deliver(channel, message)
+
+    def _deliver(self, channel: str, message: dict):
+        for queue in self._channels.get(channel, ()):
+            if queue.full():
+                # slow consumer: drop its oldest event rather than block the sender
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    @asynccontextmanager
+    async def subscribe(self, channel: str):
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._channels.setdefault(channel, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            subscribers = self._channels.get(channel)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._channels[channel]
+
+    def subscriber_count(self) -> int:
+        return sum(len(s) for s in self._channels.values())
+
+
+class RedisBroker(InProcessBroker):
+    """Publishes through Redis; one pattern subscription per worker feeds the
+    local subscribers, so open sockets don't each hold a Redis connection."""
+
+    PATTERN = "chat:*"
+
+    def __init__(self, url: str):
+        super().__init__()
+        import redis.asyncio as redis
+        self._redis = redis.from_url(url)
+        self._listener: asyncio.Task | None = None
+
+    async def publish(self, channel: str, message: dict):
+        await self._redis.publish(channel, json.dumps(message))
+
+    async def _listen(self):
+        pubsub = self._redis.pubsub()
+        await pubsub.psubscribe(self.PATTERN)
+        async for event in pubsub.listen():
+            if event["type"] != "pmessage":
+                continue
+            channel = event["channel"].decode() if isinstance(event["channel"], bytes) else event["channel"]
+            self._deliver(channel, json.loads(event["data"]))
+
+    @asynccontextmanager
+    async def subscribe(self, channel: str):
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+        async with super().subscribe(channel) as queue:
+            yield queue
+
+
+def _make_broker():
+    if os.getenv("PUBSUB_BACKEND", "memory") == "redis":
+        return RedisBroker(os.getenv("REDIS_URI", "redis://localhost:6379/0"))
+    return InProcessBroker()
+
+
+broker = _make_broker()
+
+
+def chat_channel(chat_id: str) -> str:
+    return f"chat:{chat_id}"
@@ -0,0 +1,228 @@
+# response_cache.py
+# Rendered JSON responses for hot read endpoints, with strong ETags.
+#   RESPONSE_CACHE_BACKEND=memory (default) - per-worker LRU
+#   RESPONSE_CACHE_BACKEND=redis            - shared through Redis (REDIS_URI)
+#   RESPONSE_CACHE_BACKEND=off              - always render, still send ETags
+#
+# Entries are tagged (e.g. "property:<id>", "category:house", "properties").
+# Each tag has a version that is part of the cache key; invalidate() bumps the
+# versions, so every entry built from the old data becomes unreachable at once
+# and simply ages out of the store.
+#
+# Versions must be shared by every worker, or a write handled by one worker
+# leaves the others serving stale pages until RESPONSE_CACHE_TTL. With the
+# memory backend they live in Mongo (`cache_tags`, one _id lookup per cached
+# read); RESPONSE_CACHE_VERSIONS=local keeps them in-process, which is only
+# correct for a single worker.
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import Request, Response
+from pymongo import UpdateOne
+from dotenv import load_dotenv
+from cache import TTLCache
+from database import db
+from serialization import dumps
+import metrics
+
+load_dotenv()
+
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 60))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 2000))
+
+
+class LocalVersions:
+    def __init__(self):
+        self._versions: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, tags: list[str]) -> list[int]:
+        return [self._versions.get(t, 0) for t in tags]
+
+    def bump(self, tags: list[str]):
+        with self._lock:
+            for t in tags:
+                self._versions[t] = self._versions.get(t, 0) + 1
+
+
+class MongoVersions:
+    def get(self, tags: list[str]) -> list[int]:
+        found = {d["_id"]: d["v"] for d in db.cache_tags.find({"_id": {"$in": tags}})}
+        return [found.get(t, 0) for t in tags]
+
+    def bump(self, tags: list[str]):
+        if tags:
+            db.cache_tags.bulk_write(
+                [UpdateOne({"_id": t}, {"$inc": {"v": 1}}, upsert=True) for t in tags], ordered=False
+            )
+
+
+class MemoryBackend:
+    def __init__(self, versions):
+        self._entries = TTLCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+        self._versions = versions
+
+    def versions(self, tags: list[str]) -> list[int]:
+        return self._versions.get(tags)
+
+    def bump(self, tags: list[str]):
+        self._versions.bump(tags)
+
+    def get(self, key: str):
+        return self._entries.get(key)
+
+    def set(self, key: str, entry: dict):
+        self._entries.set(key, entry)
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+class RedisBackend:
+    PREFIX = "rc:"
+
+    def __init__(self, url: str):
+        import redis
+        self._redis = redis.Redis.from_url(url)
+
+    def versions(self, tags: list[str]) -> list[int]:
+        return [int(v or 0) for v in self._redis.mget([f"{self.PREFIX}v:{t}" for t in tags])]
+
+    def bump(self, tags: list[str]):
+        pipe = self._redis.pipeline()
+        for t in tags:
+            pipe.incr(f"{self.PREFIX}v:{t}")
+        pipe.execute()
+
+    def get(self, key: str):
+        raw = self._redis.get(self.PREFIX + key)
+        return json.loads(raw) if raw else None
+
+    def set(self, key: str, entry: dict):
+        self._redis.set(self.PREFIX + key, json.dumps(entry), ex=int(RESPONSE_CACHE_TTL))
+
+    def size(self) -> int | None:
+        return None
+
+
+def _make_backend():
+    kind = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+    if kind == "redis":
+        return RedisBackend(os.getenv("REDIS_URI", "redis://localhost:6379/0"))
+    if kind == "off":
+        return None
+    local = os.getenv("RESPONSE_CACHE_VERSIONS", "mongo") == "local"
+    return MemoryBackend(LocalVersions() if local else MongoVersions())
+
+
+backend = _make_backend()
+
+# per-worker counters, exposed at /cache-stats
+stats = {"hits": 0, "misses": 0, "not_modified": 0, "invalidations": 0, "errors": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name: str):
+    with _stats_lock:
+        stats[name] += 1
+
+
+def snapshot() -> dict:
+    with _stats_lock:
+        data = dict(stats)
+    lookups = data["hits"] + data["misses"]
+    data["hit_ratio"] = round(data["hits"] / lookups, 4) if lookups else None
+    data["entries"] = backend.size() if backend else 0
+    return data
+
+
+def _metrics_lines() -> list[str]:
+    data = snapshot()
+    lines = []
+    for name in ("hits", "misses", "not_modified", "invalidations", "errors"):
+        lines += [f"# TYPE response_cache_{name}_total counter", f"response_cache_{name}_total {data[name]}"]
+    if data["entries"] is not None:
+        lines += ["# TYPE response_cache_entries gauge", f"response_cache_entries {data['entries']}"]
+    return lines
+
+
+metrics.COLLECTORS.append(_metrics_lines)
+
+
+# ---------------- Rendering ----------------
+def _render(content) -> dict:
+    body = dumps(content)
+    return {
+        "body": body.decode(),  # str, so entries round-trip through the Redis backend
+        "etag": '"' + hashlib.sha256(body).hexdigest()[:32] + '"',
+        "last_modified": format_datetime(datetime.now(timezone.utc).replace(microsecond=0), usegmt=True),
+    }
+
+
+def _not_modified(request: Request, entry: dict) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [t.strip() for t in if_none_match.split(",")]
+        return "*" in tags or entry["etag"] in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return parsedate_to_datetime(entry["last_modified"]) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _respond(request: Request, entry: dict) -> Response:
+    headers = {"ETag": entry["etag"], "Last-Modified": entry["last_modified"], "Cache-Control": "no-cache"}
+    if _not_modified(request, entry):
+        _count("not_modified")
+        return Response(status_code=304, headers=headers)
+    return Response(entry["body"], media_type="application/json", headers=headers)
+
+
+def cached_response(request: Request, tags: list[str], build) -> Response:
+    """Serve `build()`'s JSON from the cache, keyed on path + query string and
+    the current versions of `tags`. Exceptions from build() (404s etc.) are
+    raised as usual and never cached."""
+    if backend is None:
+        return _respond(request, _render(build()))
+
+    query = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+    try:
+        versions = backend.versions(tags)
+        key = f"{request.url.path}?{query}#" + ",".join(map(str, versions))
+        entry = backend.get(key)
+    except Exception as e:
+        # cache unavailable: serve uncached rather than fail the read
+        print("❌ Response cache error:", e)
+        _count("errors")
+        return _respond(request, _render(build()))
+
+    if entry is not None:
+        _count("hits")
+        return _respond(request, entry)
+
+    _count("misses")
+    entry = _render(build())
+    try:
+        backend.set(key, entry)
+    except Exception as e:
+        print("❌ Response cache error:", e)
+        _count("errors")
+    return _respond(request, entry)
+
+
+def invalidate(*tags: str):
+    if backend is None:
+        return
+    tags = [t for t in dict.fromkeys(tags) if t]
+    try:
+        backend.bump(tags)
+        _count("invalidations")
+    except Exception as e:
+        print("❌ Response cache invalidation failed:", e)
+        _count("errors")
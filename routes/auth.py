@@ -1,16 +1,17 @@
 # routes/auth.py
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel, EmailStr
-from passlib.context import CryptContext
 from jose import jwt, JWTError
 from datetime import datetime, timedelta
-from database import db
+from starlette.concurrency import run_in_threadpool
+from database import db, async_db
+from passwords import hash_password, verify_password
 import os
 import random
-import smtplib
 import secrets
 from dotenv import load_dotenv
-from routes.dependencies import get_current_user
+from routes.dependencies import get_current_user, invalidate_principal
+from routes.email_utils import send_otp_email
 import hashlib
 
 load_dotenv()
@@ -25,8 +26,6 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 60 * 24 * 7))  # default 7 days
 REFRESH_TOKEN_EXPIRE_MINUTES = int(os.getenv("REFRESH_TOKEN_EXPIRE_MINUTES", 60 * 24 * 30))  # default 30 days
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # ---------------- Models ----------------
 class UserRegister(BaseModel):
     fullName: str
@@ -49,12 +48,6 @@ class RefreshTokenRequest(BaseModel):
     refresh_token: str
 
 # ---------------- Helpers ----------------
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
-
 def create_jwt_token(data: dict, secret: str, expires_minutes: int, token_type: str = "access"):
     payload = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=expires_minutes)
@@ -67,23 +60,6 @@ def create_access_token_for_user(email: str):
 def create_refresh_token_for_user(email: str):
     return create_jwt_token({"email": email}, REFRESH_SECRET, REFRESH_TOKEN_EXPIRE_MINUTES, token_type="refresh")
 
-def send_otp_email(to_email: str, otp: str) -> bool:
-    sender = os.getenv("SMTP_USER")
-    password = os.getenv("SMTP_PASS")
-    subject = "Your OTP for Estateuro Registration"
-    body = f"Your OTP is: {otp}\nThis OTP will expire in 5 minutes."
-    message = f"Subject: {subject}\n\n{body}"
-    try:
-        with smtplib.SMTP(os.getenv("SMTP_HOST", "smtp.gmail.com"), int(os.getenv("SMTP_PORT", 587))) as server:
-            server.starttls()
-            server.login(sender, password)
-            server.sendmail(sender, to_email, message)
-        print(f"✅ OTP sent to {to_email}")
-        return True
-    except Exception as e:
-        print("❌ Error sending email:", e)
-        return False
-
 def format_user_response(user: dict, access_token: str | None = None, refresh_token: str | None = None):
     # safe fields returned to client
     resp = {
@@ -100,19 +76,21 @@ def format_user_response(user: dict, access_token: str | None = None, refresh_to
 
 # ---------------- Routes ----------------
 @router.post("/register")
-def register(request: UserRegister):
-    existing = db.users.find_one({"email": request.email})
+async def register(request: UserRegister):
+    existing = await async_db.users.find_one({"email": request.email}, {"is_verified": 1})
 
     otp = str(random.randint(100000, 999999))
     expiry_time = datetime.utcnow() + timedelta(minutes=5)
-    hashed_pw = hash_password(request.password)
+
+    # If verified, prevent duplicate registration (before paying for a hash)
+    if existing and existing.get("is_verified"):
+        raise HTTPException(status_code=400, detail="Email already registered")
+
+    hashed_pw = await hash_password(request.password)
 
     if existing:
-        # If verified, prevent duplicate registration
-        if existing.get("is_verified"):
-            raise HTTPException(status_code=400, detail="Email already registered")
         # Update user with new OTP/password/fullName/phone
-        db.users.update_one(
+        await async_db.users.update_one(
             {"email": request.email},
             {"$set": {
                 "otp": otp,
@@ -122,12 +100,12 @@ def register(request: UserRegister):
                 "phone": request.phone
             }}
         )
-        if not send_otp_email(request.email, otp):
-            raise HTTPException(status_code=500, detail="Failed to send OTP email")
+        invalidate_principal(request.email)
+        await run_in_threadpool(send_otp_email, request.email, otp, expiry_time)
         return {"message": "Email already registered but not verified. New OTP sent."}
 
     # New user
-    db.users.insert_one({
+    await async_db.users.insert_one({
         "fullName": request.fullName,
         "email": request.email,
         "password": hashed_pw,
@@ -139,8 +117,7 @@ def register(request: UserRegister):
         "refresh_token": None  # placeholder for refresh token storage
     })
 
-    if not send_otp_email(request.email, otp):
-        raise HTTPException(status_code=500, detail="Failed to send OTP email")
+    await run_in_threadpool(send_otp_email, request.email, otp, expiry_time)
 
     return {"message": "OTP sent to your email. Verify to complete registration."}
 
@@ -160,8 +137,7 @@ def resend_otp(request: ResendOTPRequest):
         {"$set": {"otp": otp, "otp_expires": expiry_time}}
     )
 
-    if not send_otp_email(request.email, otp):
-        raise HTTPException(status_code=500, detail="Failed to send OTP email")
+    send_otp_email(request.email, otp, expiry_time)
 
     return {"message": "New OTP sent to your email."}
 
@@ -180,6 +156,7 @@ def verify_otp(request: UserVerifyOTP):
         {"email": request.email},
         {"$set": {"is_verified": True}, "$unset": {"otp": "", "otp_expires": ""}}
     )
+    invalidate_principal(request.email)
 
     # fetch updated user
     user = db.users.find_one({"email": request.email})
@@ -193,10 +170,16 @@ def verify_otp(request: UserVerifyOTP):
     return format_user_response(user, access_token=access_token, refresh_token=refresh_token)
 
 @router.post("/login")
-def login(request: UserLogin):
+async def login(request: UserLogin):
     try:
-        user = db.users.find_one({"email": request.email})
-        if not user or not verify_password(request.password, user["password"]):
+        user = await async_db.users.find_one(
+            {"email": request.email},
+            {"fullName": 1, "email": 1, "phone": 1, "is_verified": 1, "password": 1},
+        )
+        if not user:
+            raise HTTPException(status_code=401, detail="Invalid email or password")
+        valid, new_hash = await verify_password(request.password, user["password"])
+        if not valid:
             raise HTTPException(status_code=401, detail="Invalid email or password")
         if not user.get("is_verified", False):
             raise HTTPException(status_code=403, detail="Email not verified")
@@ -204,9 +187,15 @@ def login(request: UserLogin):
         access_token = create_access_token_for_user(request.email)
         refresh_token = create_refresh_token_for_user(request.email)
 
-        db.users.update_one({"email": request.email}, {"$set": {"refresh_token": refresh_token}})
+        update = {"refresh_token": refresh_token}
+        if new_hash:
+            # stored hash used an outdated cost; upgrade it transparently
+            update["password"] = new_hash
+        await async_db.users.update_one({"email": request.email}, {"$set": update})
 
         return format_user_response(user, access_token=access_token, refresh_token=refresh_token)
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         print(traceback.format_exc())
@@ -245,6 +234,7 @@ def refresh_token(req: RefreshTokenRequest):
     new_refresh = create_refresh_token_for_user(email)
 
     db.users.update_one({"email": email}, {"$set": {"refresh_token": new_refresh}})
+    invalidate_principal(email)
 
     user = db.users.find_one({"email": email})
     return format_user_response(user, access_token=new_access, refresh_token=new_refresh)
@@ -254,6 +244,7 @@ def logout(current_user: dict = Depends(get_current_user)):
     # Remove refresh token from DB to revoke
     email = current_user.get("email")
     db.users.update_one({"email": email}, {"$set": {"refresh_token": None}})
+    invalidate_principal(email)
     return {"message": "Logged out successfully"}
 
 @router.get("/me")
@@ -2,6 +2,8 @@
 from fastapi import APIRouter, Depends, HTTPException
 from database import db
 from routes.dependencies import get_current_user
+from routes.pagination import PROJECTIONS
+from serialization import MongoJSONResponse
 from bson import ObjectId
 
 cart_router = APIRouter()
@@ -10,34 +12,57 @@ cart_router = APIRouter()
 @cart_router.get("/cart")
 def get_cart(current_user: dict = Depends(get_current_user)):
     user_email = current_user["email"]
-    cart = db.carts.find_one({"user": user_email})
+    cart = db.carts.find_one({"user": user_email}, {"items": 1})
     if not cart:
         return {"items": []}
 
-    items = []
-    for item in cart.get("items", []):
-        prop = db.properties.find_one({"_id": ObjectId(item["propertyId"])})
+    # one $in query for the whole cart, then restore the order items were added in
+    ids = [item["propertyId"] for item in cart.get("items", [])]
+    oids = [ObjectId(pid) for pid in ids if ObjectId.is_valid(pid)]
+    found = {
+        str(prop["_id"]): prop
+        for prop in db.properties.find({"_id": {"$in": oids}}, PROJECTIONS["card"])
+    }
+
+    items, missing = [], []
+    for pid in ids:
+        prop = found.get(pid)
         if prop:
-            prop["_id"] = str(prop["_id"])
+            prop["_id"] = pid
             items.append(prop)
-    return {"items": items}
+        else:
+            missing.append(pid)
+
+    # quietly drop properties that no longer exist
+    if missing:
+        db.carts.update_one(
+            {"user": user_email},
+            {"$pull": {"items": {"propertyId": {"$in": missing}}}}
+        )
+    return MongoJSONResponse({"items": items})
+
+# Cart size for the header badge
+@cart_router.get("/cart/count")
+def get_cart_count(current_user: dict = Depends(get_current_user)):
+    result = list(db.carts.aggregate([
+        {"$match": {"user": current_user["email"]}},
+        {"$project": {"count": {"$size": {"$ifNull": ["$items", []]}}}},
+    ]))
+    return {"count": result[0]["count"] if result else 0}
 
 # Add to cart
 @cart_router.post("/cart/{property_id}")
 def add_to_cart(property_id: str, current_user: dict = Depends(get_current_user)):
     user_email = current_user["email"]
-    prop = db.properties.find_one({"_id": ObjectId(property_id)})
+    prop = db.properties.find_one({"_id": ObjectId(property_id)}, {"_id": 1})
     if not prop:
         raise HTTPException(status_code=404, detail="Property not found")
 
-    cart = db.carts.find_one({"user": user_email})
-    if not cart:
-        db.carts.insert_one({"user": user_email, "items": [{"propertyId": property_id}]})
-    else:
-        db.carts.update_one(
-            {"user": user_email},
-            {"$addToSet": {"items": {"propertyId": property_id}}}
-        )
+    db.carts.update_one(
+        {"user": user_email},
+        {"$addToSet": {"items": {"propertyId": property_id}}},
+        upsert=True,
+    )
 
     return {"message": "Added to cart"}
 
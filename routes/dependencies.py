@@ -1,8 +1,10 @@
 # routes/dependencies.py
 from fastapi import Header, HTTPException
 from jose import jwt, JWTError
-from database import db
+from database import async_db
+from cache import TTLCache
 import os
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -10,24 +12,51 @@ load_dotenv()
 SECRET_KEY = os.getenv("JWT_SECRET", "supersecret")
 ALGORITHM = "HS256"
 
-def get_current_user(authorization: str = Header(...)):
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Missing Authorization header")
-    try:
-        scheme, token = authorization.split(" ")
-        if scheme.lower() != "bearer":
-            raise HTTPException(status_code=401, detail="Invalid auth scheme")
-    except ValueError:
-        raise HTTPException(status_code=401, detail="Invalid Authorization header format")
+# Only what routes read from current_user; never the password hash,
+# refresh token or activities array.
+PRINCIPAL_FIELDS = {"email": 1, "fullName": 1, "phone": 1, "is_verified": 1}
+
+# verified access token -> principal
+principal_cache = TTLCache(
+    maxsize=int(os.getenv("PRINCIPAL_CACHE_SIZE", 10_000)),
+    ttl=float(os.getenv("PRINCIPAL_CACHE_TTL", 60)),
+)
+
+
+def invalidate_principal(email: str):
+    """Forget cached principals for `email` (logout, token refresh, re-registration)."""
+    principal_cache.discard_if(lambda user: user.get("email") == email)
+
+
+async def authenticate_token(token: str) -> dict:
+    """Resolve a bearer access token to its principal or raise 401."""
+    cached = principal_cache.get(token)
+    if cached is not None:
+        return dict(cached)
 
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email = payload.get("email")
         if not email:
             raise HTTPException(status_code=401, detail="Invalid token payload")
-        user = db.users.find_one({"email": email})
+        user = await async_db.users.find_one({"email": email}, PRINCIPAL_FIELDS)
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
-        return user
+        # never serve a cached principal past the token's own expiry
+        principal_cache.set(token, user, ttl=payload.get("exp", time.time() + principal_cache.ttl) - time.time())
+        return dict(user)
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
+
+
+async def get_current_user(authorization: str = Header(...)):
+    if not authorization:
+        raise HTTPException(status_code=401, detail="Missing Authorization header")
+    try:
+        scheme, token = authorization.split(" ")
+        if scheme.lower() != "bearer":
+            raise HTTPException(status_code=401, detail="Invalid auth scheme")
+    except ValueError:
+        raise HTTPException(status_code=401, detail="Invalid Authorization header format")
+
+    return await authenticate_token(token)
@@ -1,7 +1,15 @@
-# routes/email_util.py
-import smtplib, ssl, os, random
+# routes/email_utils.py
+# Outbound email goes through a persisted outbox (`email_outbox`). Routes only
+# enqueue; a worker thread per process claims due messages (leased_queue.py),
+# sends them over one reused SMTP connection and retries failures with
+# exponential backoff.
+import smtplib, ssl, os, random, time
+from datetime import datetime
 from email.mime.text import MIMEText
 from dotenv import load_dotenv
+from database import db
+from leased_queue import LeasedQueue, QueueWorker
+from metrics import timed
 
 # Load env vars
 load_dotenv()
@@ -10,6 +18,19 @@ SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
 SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
 SMTP_USER = os.getenv("SMTP_USER")
 SMTP_PASS = os.getenv("SMTP_PASS")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") == "1"
+EMAIL_FROM = os.getenv("EMAIL_FROM", SMTP_USER or "no-reply@estateuro.local")
+
+EMAIL_TRANSPORT = os.getenv("EMAIL_TRANSPORT", "smtp")  # smtp | console
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", 20))
+EMAIL_POLL_SECONDS = float(os.getenv("EMAIL_POLL_SECONDS", 5))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", 6))
+EMAIL_BACKOFF_SECONDS = float(os.getenv("EMAIL_BACKOFF_SECONDS", 10))
+EMAIL_LEASE_SECONDS = 120  # a claimed message goes back to the queue if its worker dies
+SMTP_IDLE_SECONDS = 60     # close the pooled connection after this long unused
+
+outbox = LeasedQueue("email_outbox", EMAIL_LEASE_SECONDS, EMAIL_MAX_ATTEMPTS, EMAIL_BACKOFF_SECONDS,
+                     claimed="sending", done="sent", done_at="sent_at")
 
 
 # ---------- OTP Generator ----------
@@ -18,40 +39,130 @@ def generate_otp(length: int = 6) -> str:
     return "".join([str(random.randint(0, 9)) for _ in range(length)])
 
 
-# ---------- Email Sender ----------
-def send_email(to_email: str, subject: str, message: str) -> bool:
-    """Send an email via SMTP with TLS."""
-    try:
-        msg = MIMEText(message)
-        msg["Subject"] = subject
-        msg["From"] = SMTP_USER
-        msg["To"] = to_email
+# ---------- Transports ----------
+class SMTPTransport:
+    """Keeps one authenticated SMTP connection open between batches.
+
+    Point SMTP_HOST/SMTP_PORT at a local stand-in (e.g. aiosmtpd) with
+    SMTP_STARTTLS=0 and no SMTP_USER for tests.
+    """
 
-        context = ssl.create_default_context()
-        with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-            server.starttls(context=context)
+    def __init__(self):
+        self._server = None
+        self._last_used = 0.0
+
+    def _connect(self):
+        server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30)
+        if SMTP_STARTTLS:
+            server.starttls(context=ssl.create_default_context())
+        if SMTP_USER:
             server.login(SMTP_USER, SMTP_PASS)
-            server.sendmail(SMTP_USER, to_email, msg.as_string())
+        return server
 
-        print(f"✅ Email sent to {to_email}")
-        return True
-    except Exception as e:
-        print("❌ Email failed:", e)
-        return False
+    def _connection(self):
+        now = time.monotonic()
+        if self._server is not None and now - self._last_used > SMTP_IDLE_SECONDS:
+            self.close()
+        if self._server is None:
+            self._server = self._connect()
+        self._last_used = now
+        return self._server
 
+    def send(self, to_email: str, raw_message: str):
+        with timed("smtp"):
+            try:
+                self._connection().sendmail(EMAIL_FROM, to_email, raw_message)
+            except (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError):
+                # stale pooled connection: reconnect once, then let the error through.
+                # Not OSError: every SMTPException is one, and a refused recipient or
+                # rejected message must not be sent again.
+                self.close()
+                self._connection().sendmail(EMAIL_FROM, to_email, raw_message)
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
+
+
+class ConsoleTransport:
+    def send(self, to_email: str, raw_message: str):
+        print(f"📧 To {to_email}:\n{raw_message}")
+
+    def close(self):
+        pass
+
+
+def _make_transport():
+    return ConsoleTransport() if EMAIL_TRANSPORT == "console" else SMTPTransport()
 
-# ---------- OTP Mail Wrapper ----------
-def send_otp_email(to_email: str, otp: str) -> bool:
-    """Send a formatted OTP email."""
-    subject = "Your OTP Code for Estateuro"
-    body = f"""
-Hello,
 
-Your OTP code is: {otp}
+# ---------- Outbox ----------
+def enqueue_email(to_email: str, subject: str, body: str, expires_at: datetime | None = None):
+    """Persist an email for the worker; returns immediately. Mail still unsent
+    at `expires_at` (e.g. a one-time code) is dropped instead of delivered late."""
+    now = datetime.utcnow()
+    doc = {
+        "to": to_email,
+        "subject": subject,
+        "body": body,
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now,
+    }
+    if expires_at is not None:
+        doc["expires_at"] = expires_at
+    db.email_outbox.insert_one(doc)
+    worker.wake()
 
-⚠️ This code will expire in 5 minutes.
 
-Thank you,  
-Estateuro Team
-"""
-    return send_email(to_email, subject, body)
+def render_email(doc: dict) -> str:
+    msg = MIMEText(doc["body"])
+    msg["Subject"] = doc["subject"]
+    msg["From"] = EMAIL_FROM
+    msg["To"] = doc["to"]
+    return msg.as_string()
+
+
+def deliver_batch(transport, limit: int = EMAIL_BATCH_SIZE) -> int:
+    """Send one batch over `transport`; returns how many messages were claimed."""
+    batch = outbox.claim(limit)
+    for doc in batch:
+        if doc.get("expires_at") and doc["expires_at"] <= datetime.utcnow():
+            db.email_outbox.update_one(
+                {"_id": doc["_id"]}, {"$set": {"status": "expired"}, "$unset": {"locked_until": ""}}
+            )
+            continue
+        try:
+            transport.send(doc["to"], render_email(doc))
+            outbox.complete(doc["_id"])
+        except Exception as e:
+            attempts = outbox.retry(doc, e)
+            print(f"❌ Email to {doc['to']} failed (attempt {attempts}):", e)
+    return len(batch)
+
+
+class OutboxWorker(QueueWorker):
+    def setup(self):
+        self._transport = _make_transport()
+
+    def run_batch(self) -> int:
+        return deliver_batch(self._transport, self.batch_size)
+
+    def teardown(self):
+        self._transport.close()
+
+
+worker = OutboxWorker("email-outbox", EMAIL_POLL_SECONDS, EMAIL_BATCH_SIZE)
+
+
+# ---------- OTP Mail Wrapper ----------
+def send_otp_email(to_email: str, otp: str, expires_at: datetime):
+    """Queue the registration OTP email; it is never sent after the code expires."""
+    subject = "Your OTP for Estateuro Registration"
+    body = f"Your OTP is: {otp}\nThis OTP will expire in 5 minutes."
+    enqueue_email(to_email, subject, body, expires_at=expires_at)
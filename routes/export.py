@@ -0,0 +1,90 @@
+# routes/export.py
+# Full-catalogue export for analytics. Streams straight from a server-side
+# cursor, so memory stays flat however many listings there are; `since=` makes
+# incremental pulls cheap (created_at is indexed).
+import csv
+import io
+import os
+import zlib
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from database import db
+from routes.dependencies import get_current_user
+from routes.pagination import PROJECTIONS
+from serialization import iter_ndjson, NDJSON_MEDIA_TYPE
+
+router = APIRouter()
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+# comma-separated emails allowed to export; empty means any signed-in user
+EXPORT_ALLOWED = {e.strip().lower() for e in os.getenv("EXPORT_ALLOWED_EMAILS", "").split(",") if e.strip()}
+
+CSV_COLUMNS = [
+    "_id", "title", "description", "price", "category", "latitude", "longitude",
+    "owner", "ownerFullName", "mobileNO", "images_status", "images", "created_at",
+]
+CSV_CHUNK_ROWS = 500
+
+
+def iter_csv(docs):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(CSV_COLUMNS)
+    rows = 0
+    for doc in docs:
+        row = []
+        for col in CSV_COLUMNS:
+            value = doc.get(col)
+            if col == "images":
+                value = " ".join(value or [])
+            elif isinstance(value, datetime):
+                value = value.isoformat()
+            row.append("" if value is None else value)
+        writer.writerow(row)
+        rows += 1
+        if rows % CSV_CHUNK_ROWS == 0:
+            yield buf.getvalue().encode()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode()
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+@router.get("/export/properties")
+def export_properties(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    since: datetime = None,
+    gzip: bool = False,
+    current_user: dict = Depends(get_current_user),
+):
+    """Every listing, oldest first. Pass the last `created_at` you received as
+    `since=` to fetch only what was added after it."""
+    if EXPORT_ALLOWED and current_user["email"].lower() not in EXPORT_ALLOWED:
+        raise HTTPException(status_code=403, detail="Not allowed to export")
+
+    query = {"created_at": {"$gt": since}} if since else {}
+    cursor = (
+        db.properties.find(query, PROJECTIONS["full"])
+        .sort([("created_at", 1), ("_id", 1)])
+        .batch_size(EXPORT_BATCH_SIZE)
+    )
+
+    if format == "csv":
+        chunks, media_type, ext = iter_csv(cursor), "text/csv", "csv"
+    else:
+        chunks, media_type, ext = iter_ndjson(cursor), NDJSON_MEDIA_TYPE, "ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="properties.{ext}"'}
+    if gzip:
+        chunks = gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+    # sync generators: Starlette pulls each chunk in the threadpool
+    return StreamingResponse(chunks, media_type=media_type, headers=headers)
@@ -0,0 +1,152 @@
+# routes/facets.py
+# Combined filtering for the listing page: category, price range, date range and
+# map viewport, with sort + keyset pagination, plus facet counts for the same
+# filter set, all in one $facet aggregation (one round-trip to Mongo).
+#
+# The leading $match carries every filter so it can use the category/price/
+# created_at compound indexes (or the 2dsphere index for a viewport); the
+# facets then only see the matching documents.
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Query, Request
+from database import db
+from routes.pagination import (
+    DEFAULT_LIMIT, CURSOR_KINDS, encode_cursor, decode_cursor, resolve_sort, resolve_projection,
+    pipeline_projection, clamp_limit,
+)
+from routes.geo import bbox_filter
+from routes.property import VALID_CATEGORIES
+from response_cache import cached_response
+
+router = APIRouter()
+
+# lower bounds of the price facet buckets; the last one is open-ended
+PRICE_BUCKETS = [0, 1_000_000, 2_500_000, 5_000_000, 10_000_000, 25_000_000]
+
+
+# ---------------- Helpers ----------------
+def _parse_categories(category: str | None) -> list[str]:
+    if not category:
+        return []
+    categories = [c.strip().lower() for c in category.split(",") if c.strip()]
+    invalid = [c for c in categories if c not in VALID_CATEGORIES]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid category. Must be one of {VALID_CATEGORIES}")
+    return categories
+
+
+def build_filter(categories: list[str], min_price: float | None, max_price: float | None,
+                 created_from: datetime | None, created_to: datetime | None, bbox: tuple | None) -> dict:
+    query = {}
+    if categories:
+        query["category"] = categories[0] if len(categories) == 1 else {"$in": categories}
+    if min_price is not None or max_price is not None:
+        if min_price is not None and max_price is not None and min_price > max_price:
+            raise HTTPException(status_code=400, detail="min_price is greater than max_price")
+        query["price"] = {}
+        if min_price is not None:
+            query["price"]["$gte"] = min_price
+        if max_price is not None:
+            query["price"]["$lte"] = max_price
+    if created_from or created_to:
+        query["created_at"] = {}
+        if created_from:
+            query["created_at"]["$gte"] = created_from
+        if created_to:
+            query["created_at"]["$lt"] = created_to
+    if bbox:
+        query.update(bbox_filter(*bbox))
+    return query
+
+
+def _price_facet(rows: list[dict]) -> list[dict]:
+    counts = {row["_id"]: row["count"] for row in rows}
+    counts[PRICE_BUCKETS[-1]] = counts.pop("open", 0)
+    upper = PRICE_BUCKETS[1:] + [None]
+    return [{"min": low, "max": high, "count": counts.get(low, 0)} for low, high in zip(PRICE_BUCKETS, upper)]
+
+
+def facet_page(query: dict, sort: str, limit: int, cursor: str | None, fields: str) -> dict:
+    field, direction = resolve_sort(sort)
+    projection = resolve_projection(fields, field)
+    limit = clamp_limit(limit)
+
+    page = []
+    if cursor:
+        value, oid = decode_cursor(cursor, CURSOR_KINDS.get(field))
+        op = "$lt" if direction < 0 else "$gt"
+        page.append({"$match": {"$or": [{field: {op: value}}, {field: value, "_id": {op: oid}}]}})
+    page += [
+        {"$sort": {field: direction, "_id": direction}},
+        {"$limit": limit + 1},
+        {"$project": pipeline_projection(projection)},
+    ]
+
+    pipeline = [
+        {"$match": query},
+        {"$facet": {
+            "items": page,
+            "categories": [
+                {"$group": {"_id": "$category", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1, "_id": 1}},
+            ],
+            "price": [
+                # negative or non-numeric prices fit no bucket (and no price
+                # filter), so they must not reach the open-ended "default" one
+                {"$match": {"price": {"$gte": 0, "$type": "number"}}},
+                {"$bucket": {
+                    "groupBy": "$price",
+                    "boundaries": PRICE_BUCKETS,
+                    "default": "open",
+                    "output": {"count": {"$sum": 1}},
+                }},
+            ],
+            "total": [{"$count": "count"}],
+        }},
+    ]
+    result = next(db.properties.aggregate(pipeline))
+
+    items = result["items"]
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1].get(field), items[-1]["_id"])
+    return {
+        "items": items,
+        "next": next_cursor,
+        "facets": {
+            "total": result["total"][0]["count"] if result["total"] else 0,
+            "categories": [{"category": row["_id"], "count": row["count"]} for row in result["categories"]],
+            "price": _price_facet(result["price"]),
+        },
+    }
+
+
+# ---------------- Filter + facets ----------------
+@router.get("/properties/filter")
+def filter_properties(
+    request: Request,
+    category: str = None,
+    min_price: float = Query(None, ge=0),
+    max_price: float = Query(None, ge=0),
+    created_from: datetime = None,
+    created_to: datetime = None,
+    min_lat: float = Query(None, ge=-90, le=90),
+    min_lng: float = Query(None, ge=-180, le=180),
+    max_lat: float = Query(None, ge=-90, le=90),
+    max_lng: float = Query(None, ge=-180, le=180),
+    sort: str = "recent",
+    cursor: str = None,
+    limit: int = Query(DEFAULT_LIMIT, ge=1),
+    fields: str = "card",
+):
+    """One page of matching listings plus total, per-category and per-price-bucket
+    counts for the whole filter. `category` takes a comma-separated list; the
+    viewport needs all four of min_lat/min_lng/max_lat/max_lng."""
+    bbox = (min_lat, min_lng, max_lat, max_lng)
+    if all(v is None for v in bbox):
+        bbox = None
+    elif any(v is None for v in bbox):
+        raise HTTPException(status_code=400, detail="Bounding box needs min_lat, min_lng, max_lat and max_lng")
+
+    query = build_filter(_parse_categories(category), min_price, max_price, created_from, created_to, bbox)
+    return cached_response(request, ["properties"], lambda: facet_page(query, sort, limit, cursor, fields))
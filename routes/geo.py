@@ -0,0 +1,116 @@
+# routes/geo.py
+from fastapi import APIRouter, HTTPException, Query
+from database import db
+from routes.pagination import (
+    DEFAULT_LIMIT, encode_cursor, decode_cursor, resolve_projection, pipeline_projection, clamp_limit,
+)
+from serialization import MongoJSONResponse
+
+router = APIRouter()
+
+MAX_RADIUS_KM = 200
+
+
+# ---------------- Helpers ----------------
+def geo_point(latitude: float, longitude: float) -> dict:
+    """GeoJSON point stored on each property as `geo` (2dsphere indexed)."""
+    return {"type": "Point", "coordinates": [longitude, latitude]}
+
+
+def bbox_filter(min_lat: float, min_lng: float, max_lat: float, max_lng: float) -> dict:
+    """`geo` inside a map viewport; raises 400 for an empty or inverted box."""
+    if min_lat >= max_lat or min_lng >= max_lng:
+        raise HTTPException(status_code=400, detail="Invalid bounding box")
+    box = {
+        "type": "Polygon",
+        "coordinates": [[
+            [min_lng, min_lat], [max_lng, min_lat], [max_lng, max_lat],
+            [min_lng, max_lat], [min_lng, min_lat],
+        ]],
+    }
+    return {"geo": {"$geoWithin": {"$geometry": box}}}
+
+
+def _near_pipeline(geo_near: dict, after, limit: int, projection: dict, by_id: bool = False) -> list:
+    pipeline = [{"$geoNear": geo_near}]
+    if after:
+        distance, oid = after
+        pipeline.append({"$match": {"$or": [
+            {"distance": {"$gt": distance}},
+            {"distance": distance, "_id": {"$gt": oid}},
+        ]}})
+    if by_id:
+        pipeline.append({"$sort": {"_id": 1}})
+    pipeline += [{"$limit": limit}, {"$project": pipeline_projection(projection)}]
+    return pipeline
+
+
+def _near_page(center: dict, query: dict, max_distance: float | None,
+               cursor: str | None, limit: int, fields: str):
+    limit = clamp_limit(limit)
+    geo_near = {
+        "near": center,
+        "distanceField": "distance",
+        "spherical": True,
+        "query": query,
+    }
+    if max_distance is not None:
+        geo_near["maxDistance"] = max_distance
+    after = decode_cursor(cursor, "num", nullable=False) if cursor else None
+    if after:
+        geo_near["minDistance"] = after[0]
+    projection = resolve_projection(fields, "distance")
+
+    # $geoNear already emits nearest first, so the page streams: no $sort over
+    # everything in the radius, just the first limit + 1 documents
+    docs = list(db.properties.aggregate(_near_pipeline(geo_near, after, limit + 1, projection)))
+    if len(docs) > limit and docs[limit - 1]["distance"] == docs[limit]["distance"]:
+        # the page ends inside a group of equidistant listings (same building),
+        # whose order $geoNear leaves open: take that group in _id order instead
+        tie = docs[limit]["distance"]
+        docs = [d for d in docs if d["distance"] < tie]
+        group = {**geo_near, "minDistance": tie, "maxDistance": tie}
+        docs += db.properties.aggregate(_near_pipeline(group, after, limit + 1 - len(docs), projection, by_id=True))
+    docs.sort(key=lambda d: (d["distance"], d["_id"]))
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1]["distance"], docs[-1]["_id"])
+    return MongoJSONResponse({"items": docs, "next": next_cursor})
+
+
+# ---------------- Nearby (radius) ----------------
+@router.get("/properties/nearby")
+def properties_nearby(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(5, gt=0, le=MAX_RADIUS_KM),
+    category: str = None,
+    cursor: str = None,
+    limit: int = Query(DEFAULT_LIMIT, ge=1),
+    fields: str = "card",
+):
+    """Properties within `radius_km` of a point, nearest first (distance in metres)."""
+    query = {"category": category.lower()} if category else {}
+    return _near_page(geo_point(lat, lng), query, radius_km * 1000, cursor, limit, fields)
+
+
+# ---------------- Map viewport (bounding box) ----------------
+@router.get("/properties/within")
+def properties_within(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lng: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lng: float = Query(..., ge=-180, le=180),
+    category: str = None,
+    cursor: str = None,
+    limit: int = Query(DEFAULT_LIMIT, ge=1),
+    fields: str = "card",
+):
+    """Properties inside the map viewport, nearest to its centre first."""
+    query = bbox_filter(min_lat, min_lng, max_lat, max_lng)
+    if category:
+        query["category"] = category.lower()
+    center = geo_point((min_lat + max_lat) / 2, (min_lng + max_lng) / 2)
+    return _near_page(center, query, None, cursor, limit, fields)
@@ -0,0 +1,479 @@
+# routes/imports.py
+# Bulk listing import for agency feeds. The upload is parsed into `import_rows`
+# (one staged document per feed row) and answered with 202 and a job id; a
+# leased job (leased_queue.py) then
+#   - validates the staged rows in order and upserts IMPORT_BATCH_SIZE of them
+#     per unordered bulk_write, keyed on (owner, external_id), so re-importing
+#     a feed updates listings in place; `rows_done` is the resume point,
+#   - fetches and stores image URLs once the rows are live (images_status
+#     "pending" until then), IMPORT_LISTINGS_IN_FLIGHT listings at a time;
+#     unchanged image lists are skipped.
+# Progress and per-row errors are kept on the `import_jobs` document. A job
+# interrupted by a restart is picked up again when its lease runs out.
+#
+# Image URLs come from users, so every fetch only goes to public addresses:
+# the host is resolved here, private/loopback/link-local answers are refused,
+# the connection is pinned to the checked address, each redirect hop is
+# checked again, and only image content types that Pillow decodes are kept.
+import asyncio
+import csv
+import io
+import ipaddress
+import os
+import socket
+import time
+from datetime import datetime
+import httpx
+import orjson
+from bson import ObjectId
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from database import db
+from image_pipeline import store_images
+from leased_queue import LeasedQueue, QueueWorker
+from metrics import timed
+from response_cache import invalidate
+from routes.dependencies import get_current_user
+from routes.geo import geo_point
+from routes.property import VALID_CATEGORIES
+from routes.search import build_search_tokens
+from serialization import MongoJSONResponse
+
+router = APIRouter()
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 1000))
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", 50_000))
+IMPORT_MAX_ERRORS = 1000  # per-row errors kept on the job; error_count has the total
+IMPORT_MAX_PRICE = float(os.getenv("IMPORT_MAX_PRICE", 1e11))
+IMPORT_MAX_IMAGES = int(os.getenv("IMPORT_MAX_IMAGES", 20))
+IMPORT_FETCH_CONCURRENCY = int(os.getenv("IMPORT_FETCH_CONCURRENCY", 8))
+IMPORT_LISTINGS_IN_FLIGHT = int(os.getenv("IMPORT_LISTINGS_IN_FLIGHT", 4))
+IMPORT_MAX_IMAGE_BYTES = int(os.getenv("IMPORT_MAX_IMAGE_BYTES", 15 * 1024 * 1024))
+IMPORT_MAX_REDIRECTS = 3
+IMPORT_IMAGE_TYPES = {"image/jpeg", "image/png", "image/webp", "image/gif", "image/bmp", "image/tiff"}
+
+IMPORT_POLL_SECONDS = float(os.getenv("IMPORT_POLL_SECONDS", 5))
+IMPORT_MAX_ATTEMPTS = int(os.getenv("IMPORT_MAX_ATTEMPTS", 5))
+IMPORT_BACKOFF_SECONDS = float(os.getenv("IMPORT_BACKOFF_SECONDS", 30))
+IMPORT_LEASE_SECONDS = 300  # renewed after every batch of rows and while images are fetched
+
+REQUIRED_FIELDS = ["external_id", "title", "description", "price", "latitude", "longitude", "category", "mobileNO"]
+
+queue = LeasedQueue("import_jobs", IMPORT_LEASE_SECONDS, IMPORT_MAX_ATTEMPTS, IMPORT_BACKOFF_SECONDS)
+
+
+class RowError(ValueError):
+    pass
+
+
+# ---------------- Parsing ----------------
+def iter_ndjson_rows(fileobj):
+    for line in fileobj:
+        if not line.strip():
+            continue
+        try:
+            row = orjson.loads(line)
+        except orjson.JSONDecodeError as e:
+            yield RowError(f"Invalid JSON: {e}")
+            continue
+        yield row if isinstance(row, dict) else RowError("Each line must be a JSON object")
+
+
+def iter_csv_rows(fileobj):
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    for row in csv.DictReader(text):
+        row.pop(None, None)  # cells beyond the header
+        # images are space-separated, as written by the CSV export
+        row["images"] = (row.get("images") or "").split()
+        yield row
+
+
+def stage_rows(job_id: ObjectId, fileobj, fmt: str) -> int:
+    """Store every feed row for the job; returns the row count."""
+    rows = iter_csv_rows(fileobj) if fmt == "csv" else iter_ndjson_rows(fileobj)
+    now = datetime.utcnow()
+    batch, count = [], 0
+    for count, raw in enumerate(rows, start=1):
+        if count > IMPORT_MAX_ROWS:
+            raise HTTPException(status_code=413, detail=f"Feeds are limited to {IMPORT_MAX_ROWS} rows")
+        staged = {"job": job_id, "row": count, "created_at": now}
+        if isinstance(raw, RowError):
+            staged["error"] = str(raw)
+        else:
+            # kept encoded: feed keys may contain characters Mongo won't store as field names
+            staged["data"] = orjson.dumps(raw)
+        batch.append(staged)
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            db.import_rows.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        db.import_rows.insert_many(batch, ordered=False)
+    return count
+
+
+def _number(row: dict, field: str, low: float, high: float) -> float:
+    try:
+        value = float(row[field])
+    except (TypeError, ValueError):
+        raise RowError(f"{field} must be a number")
+    if not low <= value <= high:
+        raise RowError(f"{field} must be between {low:g} and {high:g}")
+    return value
+
+
+def validate_row(row: dict) -> dict:
+    missing = [f for f in REQUIRED_FIELDS if row.get(f) in (None, "")]
+    if missing:
+        raise RowError(f"Missing fields: {', '.join(missing)}")
+    category = str(row["category"]).strip().lower()
+    if category not in VALID_CATEGORIES:
+        raise RowError(f"Invalid category. Must be one of {VALID_CATEGORIES}")
+    images = row.get("images") or []
+    if isinstance(images, str):
+        images = images.split()
+    if not isinstance(images, list) or not all(isinstance(u, str) and u.startswith(("http://", "https://")) for u in images):
+        raise RowError("images must be a list of http(s) URLs")
+    if len(images) > IMPORT_MAX_IMAGES:
+        raise RowError(f"At most {IMPORT_MAX_IMAGES} images per listing")
+
+    latitude = _number(row, "latitude", -90, 90)
+    longitude = _number(row, "longitude", -180, 180)
+    title, description = str(row["title"]).strip(), str(row["description"]).strip()
+    return {
+        "external_id": str(row["external_id"]).strip(),
+        "title": title,
+        "description": description,
+        "price": _number(row, "price", 0, IMPORT_MAX_PRICE),
+        "latitude": latitude,
+        "longitude": longitude,
+        "geo": geo_point(latitude, longitude),
+        "category": category,
+        "mobileNO": str(row["mobileNO"]).strip(),
+        "search_tokens": build_search_tokens(title, description, category),
+        "image_sources": list(dict.fromkeys(images)),
+    }
+
+
+# ---------------- Writing ----------------
+def _record(job_id, errors: list[dict] = (), fields: dict | None = None, **counts):
+    update = {"$inc": {k: v for k, v in counts.items() if v}}
+    if errors:
+        update["$inc"]["error_count"] = len(errors)
+        update["$push"] = {"errors": {"$each": list(errors), "$slice": IMPORT_MAX_ERRORS}}
+    if fields:
+        update["$set"] = fields
+    update = {op: value for op, value in update.items() if value}
+    if update:
+        db.import_jobs.update_one({"_id": job_id}, update)
+
+
+def write_batch(job_id, owner: dict, batch: list[tuple[int, dict]]):
+    """Upsert one batch of validated rows. Listings whose images need fetching
+    are left "pending", stamped with this job and their feed row."""
+    errors = []
+    # last row wins when a feed repeats an external_id within a batch
+    latest: dict[str, tuple[int, dict]] = {}
+    for row_no, doc in batch:
+        if doc["external_id"] in latest:
+            errors.append({"row": latest[doc["external_id"]][0], "external_id": doc["external_id"],
+                           "error": "Superseded by a later row with the same external_id"})
+        latest[doc["external_id"]] = (row_no, doc)
+    rows = list(latest.values())
+
+    existing = {
+        d["external_id"]: d
+        for d in db.properties.find(
+            {"owner": owner["email"], "external_id": {"$in": list(latest)}},
+            {"external_id": 1, "image_sources": 1, "images_status": 1, "category": 1},
+        )
+    }
+
+    now = datetime.utcnow()
+    ops = []
+    for row_no, doc in rows:
+        sources = doc.pop("image_sources")
+        update = {
+            "$set": {**doc, "ownerFullName": owner.get("fullName", ""), "updated_at": now,
+                     "import_job": job_id, "import_row": row_no},
+            "$setOnInsert": {"created_at": now},
+        }
+        prev = existing.get(doc["external_id"])
+        unchanged = prev is not None and prev.get("image_sources") == sources and prev.get("images_status") == "ready"
+        if not sources:
+            update["$set"].update(images=[], image_variants=[], image_sources=[], images_status="ready")
+        elif not unchanged:
+            update["$set"].update(image_sources=sources, images_status="pending")
+            update["$setOnInsert"].update(images=[], image_variants=[])
+        ops.append(UpdateOne({"owner": owner["email"], "external_id": doc["external_id"]}, update, upsert=True))
+
+    try:
+        details = db.properties.bulk_write(ops, ordered=False).bulk_api_result
+    except BulkWriteError as e:
+        details = e.details
+    failed = 0
+    for err in details.get("writeErrors", []):
+        row_no, doc = rows[err["index"]]
+        failed += 1
+        errors.append({"row": row_no, "external_id": doc["external_id"], "error": err.get("errmsg", "Write failed")})
+
+    categories = {doc["category"] for _, doc in rows} | {p.get("category") for p in existing.values()}
+    invalidate("properties", *(f"category:{c}" for c in categories if c),
+               *(f"property:{p['_id']}" for p in existing.values()))
+    _record(job_id, errors, inserted=details.get("nUpserted", 0),
+            updated=len(rows) - failed - details.get("nUpserted", 0))
+
+
+def import_rows(job: dict) -> bool:
+    """Validate and write the staged rows after `rows_done`; False if the
+    worker is stopping and the job should be handed back."""
+    owner = {"email": job["owner"], "fullName": job.get("owner_name", "")}
+    last = job.get("rows_done", 0)
+    while True:
+        if worker.stopping():
+            return False
+        staged = list(
+            db.import_rows.find({"job": job["_id"], "row": {"$gt": last}}).sort("row", 1).limit(IMPORT_BATCH_SIZE)
+        )
+        if not staged:
+            return True
+        batch, errors = [], []
+        for item in staged:
+            raw = None
+            try:
+                if "error" in item:
+                    raise RowError(item["error"])
+                raw = orjson.loads(item["data"])
+                batch.append((item["row"], validate_row(raw)))
+            except RowError as e:
+                errors.append({"row": item["row"], "external_id": raw.get("external_id") if raw else None,
+                               "error": str(e)})
+        if batch:
+            write_batch(job["_id"], owner, batch)
+        last = staged[-1]["row"]
+        _record(job["_id"], errors, fields={"rows_done": last}, rows=len(staged))
+        queue.renew(job["_id"])
+
+
+# ---------------- Images ----------------
+def _public_address(value: str) -> bool:
+    ip = ipaddress.ip_address(value.split("%", 1)[0])
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+async def _resolve(host: str, port: int) -> str:
+    """A public address for `host`; refuses hosts with any non-public answer."""
+    try:
+        addresses = [str(ipaddress.ip_address(host))]
+    except ValueError:
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            raise RowError(f"Cannot resolve image host {host}: {e}")
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+    if not addresses or not all(_public_address(a) for a in addresses):
+        raise RowError(f"Image host {host} is not a public address")
+    return addresses[0]
+
+
+async def _download(client: httpx.AsyncClient, url: str) -> bytes:
+    target = httpx.URL(url)
+    for _ in range(IMPORT_MAX_REDIRECTS + 1):
+        if target.scheme not in ("http", "https") or not target.host:
+            raise RowError(f"Unsupported image URL: {target}")
+        address = await _resolve(target.host, target.port or (443 if target.scheme == "https" else 80))
+        # connect to the address just checked, not whatever a second lookup returns
+        request = client.build_request(
+            "GET",
+            target.copy_with(host=address),
+            headers={"Host": target.netloc.decode("ascii")},
+            extensions={"sni_hostname": target.host} if target.scheme == "https" else None,
+        )
+        with timed("image_fetch"):
+            response = await client.send(request, stream=True)
+            try:
+                if response.is_redirect:
+                    target = target.join(response.headers["location"])
+                    continue
+                if response.status_code >= 400:
+                    raise RowError(f"HTTP {response.status_code} for {url}")
+                content_type = response.headers.get("content-type", "").split(";", 1)[0].strip().lower()
+                if content_type not in IMPORT_IMAGE_TYPES:
+                    raise RowError(f"Not an image ({content_type or 'no content type'}): {url}")
+                if int(response.headers.get("content-length") or 0) > IMPORT_MAX_IMAGE_BYTES:
+                    raise RowError(f"Image larger than {IMPORT_MAX_IMAGE_BYTES} bytes: {url}")
+                data = bytearray()
+                async for chunk in response.aiter_bytes():
+                    data += chunk
+                    if len(data) > IMPORT_MAX_IMAGE_BYTES:
+                        raise RowError(f"Image larger than {IMPORT_MAX_IMAGE_BYTES} bytes: {url}")
+                return bytes(data)
+            finally:
+                await response.aclose()
+    raise RowError(f"Too many redirects: {url}")
+
+
+async def fetch_images(job: dict) -> bool:
+    """Download and store the images of every listing this job left "pending".
+    Each listing becomes "ready" or "failed"; False if the worker is stopping."""
+    job_id = job["_id"]
+    downloads = asyncio.Semaphore(IMPORT_FETCH_CONCURRENCY)
+    # bounds memory: only this many listings' payloads are held at once
+    in_flight = asyncio.Semaphore(IMPORT_LISTINGS_IN_FLIGHT)
+    tasks = set()
+
+    async with httpx.AsyncClient(timeout=30, follow_redirects=False) as client:
+        async def one(url: str) -> bytes:
+            async with downloads:
+                return await _download(client, url)
+
+        async def attach(listing: dict):
+            property_id, urls = listing["_id"], listing["image_sources"]
+            try:
+                payloads = await asyncio.gather(*(one(url) for url in urls))
+                files = [(io.BytesIO(data), url.rsplit("/", 1)[-1]) for data, url in zip(payloads, urls)]
+                variants = await asyncio.to_thread(store_images, files, allow_raw=False)
+                # a newer import may have changed the list meanwhile; it owns the listing then
+                await asyncio.to_thread(
+                    db.properties.update_one,
+                    {"_id": property_id, "image_sources": urls},
+                    {"$set": {"images": [v["full"] for v in variants], "image_variants": variants,
+                              "images_status": "ready"}, "$unset": {"images_error": ""}},
+                )
+                await asyncio.to_thread(_record, job_id, images_ready=1)
+            except Exception as e:
+                await asyncio.to_thread(
+                    db.properties.update_one,
+                    {"_id": property_id, "image_sources": urls},
+                    {"$set": {"images_status": "failed", "images_error": str(e)}},
+                )
+                error = {"row": listing.get("import_row"), "property_id": str(property_id),
+                         "error": f"Image fetch failed: {e}"}
+                await asyncio.to_thread(_record, job_id, [error], images_failed=1)
+            finally:
+                in_flight.release()
+            # list cards show images_status too, not just the detail page
+            invalidate(f"property:{property_id}", "properties", f"category:{listing.get('category')}")
+
+        cursor = db.properties.find(
+            {"import_job": job_id, "images_status": "pending"},
+            {"image_sources": 1, "import_row": 1, "category": 1},
+        ).batch_size(100)
+        renewed = time.monotonic()
+        stopped = False
+        while True:
+            await in_flight.acquire()
+            listing = await asyncio.to_thread(next, cursor, None)
+            if listing is None or worker.stopping():
+                in_flight.release()
+                stopped = listing is not None
+                break
+            task = asyncio.create_task(attach(listing))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            if time.monotonic() - renewed > IMPORT_LEASE_SECONDS / 3:
+                await asyncio.to_thread(queue.renew, job_id)
+                renewed = time.monotonic()
+        await asyncio.gather(*tasks)
+        cursor.close()
+    return not stopped
+
+
+# ---------------- Job ----------------
+def run_job(job: dict):
+    job_id = job["_id"]
+    try:
+        if job.get("phase", "rows") == "rows":
+            if not import_rows(job):
+                queue.release(job_id)
+                return
+            pending = db.properties.count_documents({"import_job": job_id, "images_status": "pending"})
+            db.import_jobs.update_one({"_id": job_id}, {"$set": {"phase": "images", "images_pending": pending}})
+        if not asyncio.run(fetch_images(job)):
+            queue.release(job_id)
+            return
+        queue.complete(job_id, unset=("last_error",))
+        db.import_rows.delete_many({"job": job_id})
+    except Exception as e:
+        # rows written so far stay; the retry resumes after rows_done
+        attempts = queue.retry(job, e)
+        if attempts >= IMPORT_MAX_ATTEMPTS:
+            db.import_rows.delete_many({"job": job_id})
+        print(f"❌ Import {job_id} failed (attempt {attempts}):", e)
+
+
+class ImportWorker(QueueWorker):
+    def run_batch(self) -> int:
+        jobs = queue.claim(1)
+        for job in jobs:
+            run_job(job)
+        return len(jobs)
+
+
+worker = ImportWorker("feed-import", IMPORT_POLL_SECONDS, batch_size=1)
+
+
+# ---------------- Routes ----------------
+def _detect_format(upload: UploadFile) -> str:
+    name = (upload.filename or "").lower()
+    if name.endswith(".csv") or (upload.content_type or "").startswith("text/csv"):
+        return "csv"
+    return "ndjson"
+
+
+@router.post("/import/properties", status_code=202)
+def import_properties(
+    file: UploadFile = File(...),
+    format: str = Query(None, pattern="^(ndjson|csv)$"),
+    current_user: dict = Depends(get_current_user),
+):
+    """Queue a feed (NDJSON or CSV, detected from the file name unless `format=`
+    is given); poll the returned job for progress and per-row errors."""
+    fmt = format or _detect_format(file)
+    now = datetime.utcnow()
+    job = {
+        "owner": current_user["email"],
+        "owner_name": current_user.get("fullName", ""),
+        "filename": file.filename,
+        "format": fmt,
+        "status": "staging",  # not claimable until every row is stored
+        "phase": "rows",
+        "attempts": 0,
+        "rows": 0,
+        "rows_done": 0,
+        "inserted": 0,
+        "updated": 0,
+        "error_count": 0,
+        "errors": [],
+        "images_pending": 0,
+        "images_ready": 0,
+        "images_failed": 0,
+        "created_at": now,
+    }
+    job_id = db.import_jobs.insert_one(job).inserted_id
+    try:
+        total = stage_rows(job_id, file.file, fmt)
+    except (UnicodeDecodeError, csv.Error, HTTPException) as e:
+        db.import_rows.delete_many({"job": job_id})
+        db.import_jobs.delete_one({"_id": job_id})
+        if isinstance(e, HTTPException):
+            raise
+        raise HTTPException(status_code=400, detail=f"Could not read the feed as UTF-8 {fmt}: {e}")
+    db.import_jobs.update_one(
+        {"_id": job_id},
+        {"$set": {"status": "pending", "rows_total": total, "next_attempt_at": datetime.utcnow()}},
+    )
+    worker.wake()
+    return {"job_id": str(job_id), "status": "pending", "status_url": f"/api/import/jobs/{job_id}"}
+
+
+@router.get("/import/jobs/{job_id}")
+def get_import_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status_code=400, detail="Invalid job ID")
+    job = db.import_jobs.find_one({"_id": ObjectId(job_id), "owner": current_user["email"]})
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return MongoJSONResponse(job)
@@ -1,19 +1,108 @@
 # routes/location.py
+# Proxy to the geocoder (Nominatim by default). The frontend calls this on
+# every keystroke, so answers are cached per normalized query, concurrent
+# identical lookups share one upstream request, and upstream calls are spaced
+# out to respect Nominatim's ~1 request/second usage policy (per process).
+#
+# GEOCODER_URL can point at a local fake geocoder for tests.
+import asyncio
+import os
+import time
+import httpx
 from fastapi import APIRouter, Query, HTTPException
-import requests
+from dotenv import load_dotenv
+from cache import TTLCache
+from metrics import timed
+
+load_dotenv()
+
+GEOCODER_URL = os.getenv("GEOCODER_URL", "https://nominatim.openstreetmap.org/search")
+GEOCODER_USER_AGENT = "RealEstateApp/1.0"  # Nominatim requires User-Agent
+GEOCODE_MIN_INTERVAL = float(os.getenv("GEOCODE_MIN_INTERVAL", 1.0))
+GEOCODE_CACHE_SIZE = int(os.getenv("GEOCODE_CACHE_SIZE", 5000))
+GEOCODE_CACHE_TTL = float(os.getenv("GEOCODE_CACHE_TTL", 24 * 3600))
+GEOCODE_RESULT_LIMIT = 5
 
 router = APIRouter()
 
-@router.get("/search-location")
-def search_location(q: str = Query(...)):
-    url = "https://nominatim.openstreetmap.org/search"
-    params = {"format": "json", "q": q, "limit": 5}
-    headers = {"User-Agent": "RealEstateApp/1.0"}  # Nominatim requires User-Agent
+geocode_cache = TTLCache(GEOCODE_CACHE_SIZE, GEOCODE_CACHE_TTL)
+_inflight: dict[str, asyncio.Task] = {}
+_client: httpx.AsyncClient | None = None
+
+
+def normalize_query(q: str) -> str:
+    return " ".join(q.lower().split())
+
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            headers={"User-Agent": GEOCODER_USER_AGENT},
+            timeout=10,
+            limits=httpx.Limits(max_connections=4, max_keepalive_connections=2),
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+class _RateLimiter:
+    """Spaces calls at least `interval` seconds apart, in arrival order."""
 
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = asyncio.Lock()
+        self._next_at = 0.0
+
+    async def wait(self):
+        async with self._lock:
+            delay = self._next_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_at = time.monotonic() + self.interval
+
+
+upstream_limiter = _RateLimiter(GEOCODE_MIN_INTERVAL)
+
+
+async def _fetch(key: str) -> list:
+    await upstream_limiter.wait()
+    with timed("geocoder"):
+        response = await get_client().get(
+            GEOCODER_URL, params={"format": "json", "q": key, "limit": GEOCODE_RESULT_LIMIT}
+        )
+        response.raise_for_status()
+    data = response.json()
+    geocode_cache.set(key, data)
+    return data
+
+
+async def geocode(q: str) -> list:
+    key = normalize_query(q)
+    if not key:
+        return []
+    cached = geocode_cache.get(key)
+    if cached is not None:
+        return cached
+
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_fetch(key))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    # shield: one caller disconnecting must not cancel the lookup for the others
+    return await asyncio.shield(task)
+
+
+@router.get("/search-location")
+async def search_location(q: str = Query(...)):
     try:
-        response = requests.get(url, params=params, headers=headers, timeout=10)
-        response.raise_for_status()  # Raise error for 4xx/5xx responses
-        data = response.json()
-        return data
-    except requests.RequestException as e:
+        return await geocode(q)
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch location: {str(e)}")
@@ -0,0 +1,191 @@
+# routes/messages.py
+# Chat messages live one per document in `chat_messages`, keyed by chatId and
+# ordered by a per-chat `seq` (taken with $inc on the chat document), so a chat
+# can grow without touching the 16 MB document limit and clients can page
+# through history instead of re-reading all of it.
+#
+# The chat document itself keeps what inboxes need: a last_message preview and
+# `members`, one entry per participant with their read watermark (last_read,
+# a message id) and a maintained unread counter.
+from datetime import datetime, timedelta
+from bson import ObjectId
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+from database import async_db
+
+DEFAULT_MESSAGE_LIMIT = 50
+MAX_MESSAGE_LIMIT = 200
+SEQ_GAP_GRACE = timedelta(seconds=10)
+MARK_READ_ATTEMPTS = 5
+
+
+def format_message(doc: dict) -> dict:
+    return {
+        "id": str(doc["_id"]),
+        "seq": doc.get("seq"),
+        "sender": doc["sender"],
+        "text": doc["text"],
+        "timestamp": doc["timestamp"],
+    }
+
+
+def new_member(email: str) -> dict:
+    return {"email": email, "unread": 0, "last_read": None}
+
+
+def is_participant(chat: dict, email: str) -> bool:
+    """Owner, buyer or a listed member; `chat` needs owner, buyer and members.email."""
+    return email in (chat.get("owner"), chat.get("buyer")) or any(
+        m.get("email") == email for m in chat.get("members", [])
+    )
+
+
+def _message_oid(value: str) -> ObjectId:
+    if not ObjectId.is_valid(value):
+        raise HTTPException(status_code=400, detail="Invalid message cursor")
+    return ObjectId(value)
+
+
+async def _cursor_seq(chat_oid: ObjectId, message_id: str) -> int:
+    doc = await async_db.chat_messages.find_one({"_id": _message_oid(message_id), "chatId": chat_oid}, {"seq": 1})
+    if not doc or doc.get("seq") is None:
+        raise HTTPException(status_code=400, detail="Invalid message cursor")
+    return doc["seq"]
+
+
+async def append_message(chat_oid: ObjectId, sender: str, text: str) -> dict | None:
+    """Store a message and refresh the chat's preview; None if the chat doesn't exist."""
+    now = datetime.utcnow()
+    chat = await async_db.chats.find_one_and_update(
+        {"_id": chat_oid, "$or": [{"owner": sender}, {"buyer": sender}, {"members.email": sender}]},
+        {"$inc": {"seq": 1}},
+        projection={"seq": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if chat is None:
+        if await async_db.chats.find_one({"_id": chat_oid}, {"_id": 1}) is None:
+            return None
+        raise HTTPException(status_code=403, detail="Not a participant in this chat")
+    doc = {
+        "_id": ObjectId(),
+        "chatId": chat_oid,
+        "seq": chat["seq"],
+        "sender": sender,
+        "text": text,
+        "timestamp": now.isoformat(),
+        "created_at": now,
+    }
+    await async_db.chat_messages.insert_one(doc)
+    message = format_message(doc)
+
+    # owner/buyer of a chat created before `members` existed
+    await async_db.chats.update_one(
+        {"_id": chat_oid, "members.email": {"$ne": sender}},
+        {"$push": {"members": new_member(sender)}},
+    )
+    # Everyone else gains an unread message in the same update that moves the
+    # preview, so mark_read (conditional on the preview) never loses one. The
+    # preview only moves forward; a message overtaken by a later one just counts.
+    unread = {"$inc": {"members.$[other].unread": 1}}
+    result = await async_db.chats.update_one(
+        {"_id": chat_oid, "$or": [{"last_message.seq": {"$lt": doc["seq"]}}, {"last_message.seq": {"$exists": False}}]},
+        {**unread, "$set": {"last_message": message, "updated_at": now, "members.$[me].last_read": message["id"]}},
+        array_filters=[{"me.email": sender}, {"other.email": {"$ne": sender}}],
+    )
+    if result.matched_count == 0:
+        await async_db.chats.update_one(
+            {"_id": chat_oid}, unread, array_filters=[{"other.email": {"$ne": sender}}]
+        )
+    return message
+
+
+def _contiguous(docs: list[dict], prev_seq: int | None) -> tuple[list[dict], bool]:
+    """Cut `docs` (oldest first) at the first hole in `seq` a concurrent send may
+    still fill; a hole older than SEQ_GAP_GRACE is taken to be a failed send."""
+    cutoff = datetime.utcnow() - SEQ_GAP_GRACE
+    for i, d in enumerate(docs):
+        seq = d.get("seq")
+        if prev_seq is not None and seq is not None and seq != prev_seq + 1 and d["created_at"] > cutoff:
+            return docs[:i], True
+        prev_seq = seq
+    return docs, False
+
+
+async def fetch_messages(chat_oid: ObjectId, before: str | None = None, after: str | None = None,
+                         limit: int = DEFAULT_MESSAGE_LIMIT):
+    """One page of a chat's history, oldest first.
+
+    Without a cursor this is the latest page; `before=` walks back through
+    older messages and `after=` returns only what arrived since a known id.
+    Pages follow the chat's `seq` counter, not `_id`: ObjectIds minted by
+    concurrent senders (or other workers) don't match insertion order.
+    """
+    limit = max(1, min(limit, MAX_MESSAGE_LIMIT))
+    query = {"chatId": chat_oid}
+    after_seq = None
+    if after:
+        after_seq = await _cursor_seq(chat_oid, after)
+        query["seq"] = {"$gt": after_seq}
+        direction = 1
+    else:
+        if before:
+            query["seq"] = {"$lt": await _cursor_seq(chat_oid, before)}
+        direction = -1
+
+    docs = await async_db.chat_messages.find(query).sort("seq", direction).limit(limit + 1).to_list(length=None)
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    if direction < 0:
+        docs.reverse()
+    if not before:
+        # the newest messages become the client's next `after=`; stop short of
+        # a seq that's been taken but not inserted yet so it isn't skipped
+        docs, cut = _contiguous(docs, after_seq)
+        if after:
+            has_more = has_more or cut
+    return [format_message(d) for d in docs], has_more
+
+
+async def mark_read(chat_oid: ObjectId, email: str) -> dict | None:
+    """Move `email`'s watermark to the chat's latest message; None if no such chat.
+
+    Only participants (owner, buyer or a member) may do this; anyone else gets
+    a 403 rather than being added to the chat. The write only applies if the
+    preview is still the message just read, so an unread message appended in
+    between is never zeroed away; after MARK_READ_ATTEMPTS the counter is
+    recounted instead.
+    """
+    for _ in range(MARK_READ_ATTEMPTS):
+        chat = await async_db.chats.find_one(
+            {"_id": chat_oid}, {"last_message": 1, "owner": 1, "buyer": 1, "members.email": 1}
+        )
+        if not chat:
+            return None
+        if not is_participant(chat, email):
+            raise HTTPException(status_code=403, detail="Not a participant in this chat")
+        last_read = (chat.get("last_message") or {}).get("id")
+        unchanged = {"_id": chat_oid, "last_message.id": last_read}
+        if any(m.get("email") == email for m in chat.get("members", [])):
+            result = await async_db.chats.update_one(
+                {**unchanged, "members.email": email},
+                {"$set": {"members.$.unread": 0, "members.$.last_read": last_read}},
+            )
+        else:
+            # chats created before `members` existed
+            result = await async_db.chats.update_one(
+                {**unchanged, "members.email": {"$ne": email}},
+                {"$push": {"members": {**new_member(email), "last_read": last_read}}},
+            )
+        if result.matched_count:
+            return {"chat_id": str(chat_oid), "last_read": last_read, "unread_count": 0}
+
+    # a busy chat kept moving: count what arrived after the watermark
+    last_seq = (chat.get("last_message") or {}).get("seq") or 0
+    unread = await async_db.chat_messages.count_documents(
+        {"chatId": chat_oid, "seq": {"$gt": last_seq}, "sender": {"$ne": email}}
+    )
+    await async_db.chats.update_one(
+        {"_id": chat_oid, "members.email": email},
+        {"$set": {"members.$.unread": unread, "members.$.last_read": last_read}},
+    )
+    return {"chat_id": str(chat_oid), "last_read": last_read, "unread_count": unread}
@@ -0,0 +1,139 @@
+# routes/pagination.py
+import base64
+import json
+import math
+from datetime import datetime
+from bson import ObjectId
+from fastapi import HTTPException
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# sort name -> (field, direction); _id is always used as the tie-breaker
+SORTS = {
+    "recent": ("created_at", -1),
+    "oldest": ("created_at", 1),
+    "price_asc": ("price", 1),
+    "price_desc": ("price", -1),
+}
+
+# sort field -> the cursor value type decode_cursor accepts for it
+CURSOR_KINDS = {"created_at": "date", "price": "num"}
+
+# fields name -> Mongo projection; internal index fields are never returned
+PROJECTIONS = {
+    "card": {
+        "title": 1,
+        "price": 1,
+        "category": 1,
+        "images": {"$slice": 1},
+        "image_variants": {"$slice": 1},
+        "images_status": 1,
+        "latitude": 1,
+        "longitude": 1,
+        "ownerFullName": 1,
+        "created_at": 1,
+    },
+    "full": {"search_tokens": 0, "geo": 0, "import_job": 0, "import_row": 0},
+}
+
+
+# ---------------- Cursor encoding ----------------
+def encode_cursor(value, oid: ObjectId) -> str:
+    if isinstance(value, datetime):
+        raw = {"t": "date", "v": value.isoformat(), "id": str(oid)}
+    else:
+        raw = {"t": "num", "v": value, "id": str(oid)}
+    return base64.urlsafe_b64encode(json.dumps(raw).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, kind: str | None = None, nullable: bool = True):
+    """Return the (sort value, _id) a cursor points at.
+
+    The value ends up inside a query, so only a finite number, an ISO datetime
+    or (when `nullable`, for documents missing the sort field) null is
+    accepted; `kind` ("num" or "date") pins which of the two it must be.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value = raw["v"]
+        if value is None:
+            if not nullable:
+                raise ValueError("null sort key")
+        elif kind is not None and raw["t"] != kind:
+            raise ValueError("wrong cursor kind")
+        elif raw["t"] == "date" and isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        elif raw["t"] != "num" or isinstance(value, bool) or not isinstance(value, (int, float)) \
+                or not math.isfinite(value):
+            raise ValueError("bad sort key")
+        return value, ObjectId(raw["id"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+# ---------------- Validation ----------------
+def resolve_sort(sort: str):
+    if sort not in SORTS:
+        raise HTTPException(status_code=400, detail=f"Invalid sort. Must be one of {list(SORTS)}")
+    return SORTS[sort]
+
+
+def resolve_projection(fields: str, sort_field: str):
+    if fields not in PROJECTIONS:
+        raise HTTPException(status_code=400, detail=f"Invalid fields. Must be one of {list(PROJECTIONS)}")
+    projection = PROJECTIONS[fields]
+    if 0 in projection.values():
+        return projection
+    # the sort key must come back so the next cursor can be built
+    return {**projection, sort_field: 1}
+
+
+def pipeline_projection(projection: dict) -> dict:
+    """Rewrite a find() projection for an aggregation $project stage, where
+    `{"$slice": n}` has to name the array it slices."""
+    return {
+        field: {"$slice": [f"${field}", spec["$slice"]]} if isinstance(spec, dict) and "$slice" in spec else spec
+        for field, spec in projection.items()
+    }
+
+
+def clamp_limit(limit: int) -> int:
+    return max(1, min(limit, MAX_LIMIT))
+
+
+# ---------------- Keyset pagination ----------------
+def paginate(collection, query: dict, sort: str = "recent", limit: int = DEFAULT_LIMIT,
+             cursor: str | None = None, fields: str = "full"):
+    """Return one page of `collection` as {"items": [...], "next": token | None}.
+
+    Pages are addressed by the (sort field, _id) of the last document seen, so
+    each page costs one indexed range scan no matter how deep the client goes.
+    """
+    field, direction = resolve_sort(sort)
+    projection = resolve_projection(fields, field)
+    limit = clamp_limit(limit)
+
+    if cursor:
+        value, oid = decode_cursor(cursor, CURSOR_KINDS.get(field))
+        op = "$lt" if direction < 0 else "$gt"
+        query = {"$and": [query, {"$or": [
+            {field: {op: value}},
+            {field: value, "_id": {op: oid}},
+        ]}]}
+
+    docs = list(
+        collection.find(query, projection)
+        .sort([(field, direction), ("_id", direction)])
+        .limit(limit + 1)
+    )
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        last = docs[-1]
+        next_cursor = encode_cursor(last.get(field), last["_id"])
+
+    # _id stays an ObjectId; serialization.dumps renders it
+    return {"items": docs, "next": next_cursor}
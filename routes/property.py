@@ -1,10 +1,19 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Depends
-from database import db
-import cloudinary.uploader
-from cloudinary_config import *
-from routes.dependencies import get_current_user
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Depends, Query, Request, WebSocket, WebSocketDisconnect
+from database import db, async_db
+from image_pipeline import store_images, variants_for_urls
+from routes.dependencies import get_current_user, authenticate_token
+from routes.pagination import paginate, DEFAULT_LIMIT, PROJECTIONS, encode_cursor, decode_cursor, clamp_limit
+from routes.search import build_search_tokens, search_filter
+from routes.geo import geo_point
+from routes.messages import append_message, fetch_messages, is_participant, mark_read, new_member, DEFAULT_MESSAGE_LIMIT
+from pubsub import broker, chat_channel
+from response_cache import cached_response, invalidate
+from cleanup import soft_delete_property, job_status
+from image_jobs import stage_images, enqueue_images
+from serialization import MongoJSONResponse, ndjson_response, wants_ndjson
 from bson import ObjectId
 from datetime import datetime
+import asyncio
 import json
 from pydantic import BaseModel
 
@@ -17,6 +26,24 @@ class ChatMessage(BaseModel):
 VALID_CATEGORIES = ["house", "villa", "apartment", "farmlands", "plots", "buildings"]
 
 
+# ---------------- Response cache ----------------
+# Cached reads are tagged with the listing, its category and "properties" (the
+# unfiltered list); every write below bumps exactly the tags it can affect.
+def _invalidate_listing(property_id, *categories: str):
+    invalidate(f"property:{property_id}", "properties", *(f"category:{c}" for c in categories))
+
+
+# ---------------- Image uploads ----------------
+# asyncImages requests hand their photos to image_jobs.py instead
+def _upload_now(images: list[UploadFile]) -> list[dict]:
+    try:
+        return store_images([(img.file, img.filename) for img in images])
+    except ValueError as e:
+        # e.g. a photo over IMAGE_MAX_PIXELS
+        raise HTTPException(status_code=400, detail=f"Image rejected: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Image upload failed: {str(e)}")
+
 
 # ---------------- Add Property ----------------
 @router.post("/add-property")
@@ -24,23 +51,20 @@ def add_property(
     title: str = Form(...),
     description: str = Form(...),
     price: float = Form(...),
-    latitude: float = Form(...),
-    longitude: float = Form(...),
+    latitude: float = Form(..., ge=-90, le=90),
+    longitude: float = Form(..., ge=-180, le=180),
     category: str = Form(...),
     mobileNO: str = Form(...),
     images: list[UploadFile] = File(...),
+    asyncImages: bool = Form(False),
     current_user: dict = Depends(get_current_user),
 ):
     if category.lower() not in VALID_CATEGORIES:
         raise HTTPException(status_code=400, detail=f"Invalid category. Must be one of {VALID_CATEGORIES}")
 
-    image_urls = []
-    try:
-        for img in images:
-            upload_result = cloudinary.uploader.upload(img.file, folder="real-estate-app", resource_type="auto")
-            image_urls.append(upload_result.get("secure_url"))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Cloudinary upload failed: {str(e)}")
+    # asyncImages: publish the listing now, attach photos when the upload job finishes
+    image_job = stage_images(images) if asyncImages else None
+    image_variants = [] if asyncImages else _upload_now(images)
 
     property_data = {
         "title": title,
@@ -48,59 +72,85 @@ def add_property(
         "price": price,
         "latitude": latitude,
         "longitude": longitude,
+        "geo": geo_point(latitude, longitude),
         "category": category.lower(),
-        "images": image_urls,
+        "images": [v["full"] for v in image_variants],
+        "image_variants": image_variants,
+        "images_status": "pending" if asyncImages else "ready",
         "owner": current_user["email"],
         "ownerFullName": current_user.get("fullName", ""),
         "mobileNO": mobileNO,
         "created_at": datetime.utcnow()
     }
 
-    result = db.properties.insert_one(property_data)
+    search_tokens = build_search_tokens(title, description, category)
+    result = db.properties.insert_one({**property_data, "search_tokens": search_tokens})
+    _invalidate_listing(result.inserted_id, property_data["category"])
+    if image_job:
+        enqueue_images(image_job, result.inserted_id, property_data["category"])
     property_data["_id"] = str(result.inserted_id)
     return {"message": "Property added successfully", "property": property_data}
 
 # ---------------- Get My Properties ----------------
 @router.get("/my-properties")
-def get_my_properties(current_user: dict = Depends(get_current_user)):
-    user_email = current_user["email"]
-    properties = list(db.properties.find({"owner": user_email}))
-    for prop in properties:
-        prop["_id"] = str(prop["_id"])
-    return {"properties": properties}
+def get_my_properties(request: Request, current_user: dict = Depends(get_current_user)):
+    cursor = db.properties.find({"owner": current_user["email"]}, PROJECTIONS["full"])
+    # Accept: application/x-ndjson streams straight from the cursor
+    if wants_ndjson(request):
+        return ndjson_response(cursor)
+    return MongoJSONResponse({"properties": list(cursor)})
 
 # ---------------- Get Property By ID ----------------
 @router.get("/property/{property_id}")
-def get_property_by_id(property_id: str):
-    prop = db.properties.find_one({"_id": ObjectId(property_id)})
-    if not prop:
-        raise HTTPException(status_code=404, detail="Property not found")
-    prop["_id"] = str(prop["_id"])
-    return prop
+def get_property_by_id(property_id: str, request: Request):
+    def load():
+        prop = db.properties.find_one({"_id": ObjectId(property_id)}, PROJECTIONS["full"])
+        if not prop:
+            raise HTTPException(status_code=404, detail="Property not found")
+        return prop
+
+    return cached_response(request, [f"property:{property_id}"], load)
 
 # ---------------- Get Properties By Category ----------------
 @router.get("/category/{category}")
-def get_properties_by_category(category: str, search: str = None):
+def get_properties_by_category(
+    category: str,
+    request: Request,
+    search: str = None,
+    cursor: str = None,
+    limit: int = Query(DEFAULT_LIMIT, ge=1),
+    sort: str = "recent",
+    fields: str = "card",
+):
     if category.lower() not in VALID_CATEGORIES:
         raise HTTPException(status_code=400, detail=f"Invalid category. Must be one of {VALID_CATEGORIES}")
     query = {"category": category.lower()}
     if search:
-        query["title"] = {"$regex": search, "$options": "i"}
-    properties = list(db.properties.find(query))
-    for prop in properties:
-        prop["_id"] = str(prop["_id"])
-    return properties
+        query.update(search_filter(search))
+    return cached_response(
+        request,
+        [f"category:{category.lower()}"],
+        lambda: paginate(db.properties, query, sort=sort, limit=limit, cursor=cursor, fields=fields),
+    )
 
 # ---------------- Get All Properties ----------------
 @router.get("/properties")
-def get_all_properties(search: str = None):
+def get_all_properties(
+    request: Request,
+    search: str = None,
+    cursor: str = None,
+    limit: int = Query(DEFAULT_LIMIT, ge=1),
+    sort: str = "recent",
+    fields: str = "card",
+):
     query = {}
     if search:
-        query["title"] = {"$regex": search, "$options": "i"}
-    properties = list(db.properties.find(query))
-    for prop in properties:
-        prop["_id"] = str(prop["_id"])
-    return properties
+        query.update(search_filter(search))
+    return cached_response(
+        request,
+        ["properties"],
+        lambda: paginate(db.properties, query, sort=sort, limit=limit, cursor=cursor, fields=fields),
+    )
 
 # ---------------- Update Property ----------------
 @router.put("/property/{property_id}")
@@ -109,12 +159,13 @@ def update_property(
     title: str = Form(...),
     description: str = Form(...),
     price: float = Form(...),
-    latitude: float = Form(...),
-    longitude: float = Form(...),
+    latitude: float = Form(..., ge=-90, le=90),
+    longitude: float = Form(..., ge=-180, le=180),
     category: str = Form(...),
     mobileNO: str = Form(...),
     images: list[UploadFile] = File(default=[]),
     existingImages: str = Form("[]"),
+    asyncImages: bool = Form(False),
     current_user: dict = Depends(get_current_user),
 ):
     prop = db.properties.find_one({"_id": ObjectId(property_id)})
@@ -124,11 +175,11 @@ def update_property(
         raise HTTPException(status_code=403, detail="Not authorized")
 
     existing_images_list = json.loads(existingImages)
-    image_urls = []
-
-    for img in images:
-        upload_result = cloudinary.uploader.upload(img.file, folder="real-estate-app", resource_type="auto")
-        image_urls.append(upload_result.get("secure_url"))
+    image_job = stage_images(images) if asyncImages and images else None
+    new_variants = [] if image_job else _upload_now(images)
+    image_variants = variants_for_urls(existing_images_list)
+    # a photo that is already on the listing is not added twice
+    image_variants += [v for v in new_variants if v not in image_variants]
 
     updated_data = {
         "title": title,
@@ -136,12 +187,20 @@ def update_property(
         "price": price,
         "latitude": latitude,
         "longitude": longitude,
+        "geo": geo_point(latitude, longitude),
         "category": category.lower(),
         "mobileNO": mobileNO,
-        "images": existing_images_list + image_urls,
+        "images": [v["full"] for v in image_variants],
+        "image_variants": image_variants,
+        "images_status": "pending" if image_job else "ready",
+        "search_tokens": build_search_tokens(title, description, category),
     }
 
     db.properties.update_one({"_id": ObjectId(property_id)}, {"$set": updated_data})
+    # a category change moves the listing between two category lists
+    _invalidate_listing(property_id, prop.get("category"), updated_data["category"])
+    if image_job:
+        enqueue_images(image_job, ObjectId(property_id), updated_data["category"])
     return {"message": "Property updated successfully"}
 
 # ---------------- Delete Property ----------------
@@ -153,14 +212,68 @@ def delete_property(property_id: str, current_user: dict = Depends(get_current_u
     if prop["owner"] != current_user["email"]:
         raise HTTPException(status_code=403, detail="Not authorized to delete this property")
 
-    db.properties.delete_one({"_id": ObjectId(property_id)})
-    db.chats.delete_many({"propertyId": property_id})
-    return {"message": "Property deleted successfully"}
+    # carts, chats and images are cleaned up by the background job (cleanup.py)
+    job = soft_delete_property(prop)
+    _invalidate_listing(property_id, prop.get("category"))
+    return {"message": "Property deleted successfully", "cleanup": job_status(job)}
 
+@router.get("/property/{property_id}/deletion")
+def get_property_deletion(property_id: str, current_user: dict = Depends(get_current_user)):
+    if not ObjectId.is_valid(property_id):
+        raise HTTPException(status_code=400, detail="Invalid property ID")
+    job = db.property_deletions.find_one({"_id": ObjectId(property_id)}, {"property": 0})
+    if not job or job.get("owner") != current_user["email"]:
+        raise HTTPException(status_code=404, detail="Deletion not found")
+    return job_status(job)
 
-# -------------------- Chat Endpoints --------------------
 
 # -------------------- Chat Endpoints --------------------
+# async routes: use async_db only
+
+# One aggregation per inbox page: only the preview and this user's unread counter
+# leave the server, never message arrays.
+async def _inbox_page(match: dict, user_email: str, counterpart: str, cursor: str | None, limit: int):
+    limit = clamp_limit(limit)
+    pipeline = [{"$match": match}]
+    if cursor:
+        updated_at, oid = decode_cursor(cursor, "date", nullable=False)
+        pipeline.append({"$match": {"$or": [
+            {"updated_at": {"$lt": updated_at}},
+            {"updated_at": updated_at, "_id": {"$lt": oid}},
+        ]}})
+    pipeline += [
+        {"$sort": {"updated_at": -1, "_id": -1}},
+        {"$limit": limit + 1},
+        {"$project": {
+            "propertyId": 1,
+            counterpart: 1,
+            "last_message": 1,
+            "updated_at": 1,
+            "me": {"$arrayElemAt": [
+                {"$filter": {"input": {"$ifNull": ["$members", []]}, "cond": {"$eq": ["$$this.email", user_email]}}},
+                0,
+            ]},
+        }},
+    ]
+    chats = await async_db.chats.aggregate(pipeline).to_list(length=None)
+
+    next_cursor = None
+    if len(chats) > limit:
+        chats = chats[:limit]
+        next_cursor = encode_cursor(chats[-1]["updated_at"], chats[-1]["_id"])
+
+    items = []
+    for c in chats:
+        me = c.get("me") or {}
+        items.append({
+            "chat_id": str(c["_id"]),
+            "property_id": c["propertyId"],
+            counterpart: c.get(counterpart, "Unknown"),
+            "last_message": c.get("last_message"),
+            "last_read": me.get("last_read"),
+            "unread_count": me.get("unread", 0)
+        })
+    return {"items": items, "next": next_cursor}
 
 # 1️⃣ Get or create chat for a property
 @router.get("/chat/property/{property_id}")
@@ -171,39 +284,55 @@ async def get_or_create_chat(property_id: str, current_user: dict = Depends(get_
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid property ID")
 
-    prop = db.properties.find_one({"_id": oid})
+    prop = await async_db.properties.find_one({"_id": oid}, {"owner": 1})
     if not prop:
         raise HTTPException(status_code=404, detail="Property not found")
 
     property_id_str = str(property_id)
-    chat = db.chats.find_one({"propertyId": property_id_str})
+    chat = await async_db.chats.find_one({"propertyId": property_id_str}, {"messages": 0, "members": 0})
 
     if not chat:
+        now = datetime.utcnow()
         new_chat = {
             "propertyId": property_id_str,
             "owner": prop["owner"],        
             "buyer": current_user["email"],
-            "messages": []
+            "members": [new_member(prop["owner"])] + (
+                [new_member(current_user["email"])] if current_user["email"] != prop["owner"] else []
+            ),
+            "last_message": None,
+            "created_at": now,
+            "updated_at": now,
         }
-        result = db.chats.insert_one(new_chat)
+        result = await async_db.chats.insert_one(new_chat)
         return {
             "chat_id": str(result.inserted_id),
             "property_id": property_id_str,
             "owner": prop["owner"],
             "buyer": current_user["email"],
-            "messages": []
+            "messages": [],
+            "has_more": False
         }
 
     # Update buyer if not set
     if "buyer" not in chat or not chat["buyer"]:
-        db.chats.update_one({"_id": chat["_id"]}, {"$set": {"buyer": current_user["email"]}})
+        await async_db.chats.update_one({"_id": chat["_id"]}, {"$set": {"buyer": current_user["email"]}})
 
+    # opening the chat is what makes a buyer a participant (mark_read won't)
+    if current_user["email"] != chat["owner"]:
+        await async_db.chats.update_one(
+            {"_id": chat["_id"], "members.email": {"$ne": current_user["email"]}},
+            {"$push": {"members": new_member(current_user["email"])}},
+        )
+
+    messages, has_more = await fetch_messages(chat["_id"])
     return {
         "chat_id": str(chat["_id"]),
         "property_id": chat["propertyId"],
         "owner": chat["owner"],
         "buyer": chat.get("buyer"),
-        "messages": chat.get("messages", [])
+        "messages": messages,
+        "has_more": has_more
     }
 
 # 2️⃣ Send a message
@@ -217,102 +346,129 @@ async def send_chat_message(
     if not text:
         raise HTTPException(status_code=400, detail="Message cannot be empty")
 
-    message = {
-        "sender": current_user["email"],
-        "text": text,
-        "timestamp": datetime.utcnow().isoformat(),
-    }
-
     # Validate chat ID
     try:
         oid = ObjectId(chat_id)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid chat ID")
 
-    result = db.chats.update_one(
-        {"_id": oid},
-        {"$push": {"messages": message}},
-    )
-
-    if result.modified_count == 0:
+    message = await append_message(oid, current_user["email"], text)
+    if message is None:
         raise HTTPException(status_code=404, detail="Chat not found")
 
+    await broker.publish(chat_channel(chat_id), {"type": "message", "data": message})
     return {"message": "Message sent", "data": message}
 
 # 3️⃣ Owner Inbox
 @router.get("/chat/inbox")
-async def owner_inbox(current_user: dict = Depends(get_current_user)):
+async def owner_inbox(
+    cursor: str = None,
+    limit: int = Query(DEFAULT_LIMIT, ge=1),
+    current_user: dict = Depends(get_current_user),
+):
     user_email = current_user["email"]
-
-    properties = list(db.properties.find({"owner": user_email}, {"_id": 1}))
-    property_ids = [str(p["_id"]) for p in properties]
-
-    if not property_ids:
-        return []
-
-    chats = list(db.chats.find({"propertyId": {"$in": property_ids}}))
-
-    formatted_chats = []
-    for c in chats:
-        messages = c.get("messages", [])
-        last_message = messages[-1] if messages else None
-        unread_count = sum(1 for m in messages if m["sender"] != user_email)
-
-        formatted_chats.append({
-            "chat_id": str(c["_id"]),
-            "property_id": c["propertyId"],
-            "buyer": c.get("buyer", "Unknown"),
-            "last_message": last_message,
-            "unread_count": unread_count
-        })
-
-    return formatted_chats
+    return await _inbox_page({"owner": user_email}, user_email, "buyer", cursor, limit)
 
 # 4️⃣ Buyer Inbox
 @router.get("/chat/buyer-inbox")
-async def buyer_inbox(current_user: dict = Depends(get_current_user)):
+async def buyer_inbox(
+    cursor: str = None,
+    limit: int = Query(DEFAULT_LIMIT, ge=1),
+    current_user: dict = Depends(get_current_user),
+):
     user_email = current_user["email"]
+    # chats this user opened or has written in, on other people's listings
+    match = {"members.email": user_email, "owner": {"$ne": user_email}}
+    return await _inbox_page(match, user_email, "owner", cursor, limit)
 
-    # Correct query for messages inside array
-    chats = list(db.chats.find({
-        "$or": [
-            {"buyer": user_email},
-            {"messages": {"$elemMatch": {"sender": user_email}}}
-        ]
-    }))
-
-    formatted_chats = []
-    for c in chats:
-        messages = c.get("messages", [])
-        last_message = messages[-1] if messages else None
-        unread_count = sum(1 for m in messages if m["sender"] != user_email)
-
-        formatted_chats.append({
-            "chat_id": str(c["_id"]),
-            "property_id": c["propertyId"],
-            "owner": c.get("owner", "Unknown"),
-            "last_message": last_message,
-            "unread_count": unread_count
-        })
-
-    return formatted_chats
-
-# 5️⃣ Get messages for a specific chat
+# 5️⃣ Get messages for a specific chat (paginated)
 @router.get("/chat/{chat_id}/messages")
-async def get_chat_messages(chat_id: str, current_user: dict = Depends(get_current_user)):
+async def get_chat_messages(
+    chat_id: str,
+    before: str = None,
+    after: str = None,
+    limit: int = Query(DEFAULT_MESSAGE_LIMIT, ge=1),
+    current_user: dict = Depends(get_current_user),
+):
     try:
         oid = ObjectId(chat_id)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid chat ID")
 
-    chat = db.chats.find_one({"_id": oid})
+    chat = await async_db.chats.find_one({"_id": oid}, {"propertyId": 1, "owner": 1, "buyer": 1})
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
 
+    messages, has_more = await fetch_messages(oid, before=before, after=after, limit=limit)
     return {
         "chat_id": str(chat["_id"]),
         "property_id": chat["propertyId"],
         "owner": chat.get("owner"),
         "buyer": chat.get("buyer"),
-        "messages": chat.get("messages", [])
-    }
\ No newline at end of file
+        "messages": messages,
+        "has_more": has_more
+    }
+
+# 6️⃣ Mark a chat read up to its latest message
+@router.post("/chat/{chat_id}/read")
+async def mark_chat_read(chat_id: str, current_user: dict = Depends(get_current_user)):
+    try:
+        oid = ObjectId(chat_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid chat ID")
+
+    result = await mark_read(oid, current_user["email"])
+    if result is None:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    return result
+
+# 7️⃣ Live chat over WebSocket: /api/chat/{chat_id}/ws?token=<access token>
+# Pushes {"type": "message", "data": {...}} for every new message; clients may
+# also send {"text": "..."} frames instead of calling /send.
+@router.websocket("/chat/{chat_id}/ws")
+async def chat_socket(websocket: WebSocket, chat_id: str, token: str = Query(...)):
+    try:
+        current_user = await authenticate_token(token)
+        oid = ObjectId(chat_id)
+    except Exception:
+        await websocket.close(code=1008)
+        return
+    chat = await async_db.chats.find_one({"_id": oid}, {"owner": 1, "buyer": 1, "members.email": 1})
+    if not chat or not is_participant(chat, current_user["email"]):
+        await websocket.close(code=1008)
+        return
+
+    await websocket.accept()
+    async with broker.subscribe(chat_channel(chat_id)) as queue:
+        async def push():
+            while True:
+                await websocket.send_json(await queue.get())
+
+        async def receive():
+            while True:
+                frame = await websocket.receive()
+                if frame["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(frame.get("code", 1000))
+                if frame.get("text") is None:
+                    continue  # binary frames are ignored
+                try:
+                    payload = json.loads(frame["text"])
+                except ValueError:
+                    continue
+                text = str(payload.get("text", "")).strip() if isinstance(payload, dict) else ""
+                if not text:
+                    continue
+                message = await append_message(oid, current_user["email"], text)
+                if message:
+                    await broker.publish(chat_channel(chat_id), {"type": "message", "data": message})
+
+        tasks = [asyncio.create_task(push()), asyncio.create_task(receive())]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if isinstance(task.exception(), WebSocketDisconnect):
+                    continue
+                task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
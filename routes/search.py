@@ -0,0 +1,114 @@
+# routes/search.py
+import re
+from fastapi import APIRouter, HTTPException, Query
+from database import db
+from routes.pagination import (
+    DEFAULT_LIMIT, encode_cursor, decode_cursor, resolve_projection, pipeline_projection, clamp_limit,
+)
+from serialization import MongoJSONResponse
+
+router = APIRouter()
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+MIN_TOKEN_LEN = 2
+MAX_TOKENS_PER_DOC = 256
+
+# weights for the Mongo text index on properties (see migrations.py)
+TEXT_INDEX_WEIGHTS = {"title": 10, "category": 5, "description": 1}
+
+
+# ---------------- Tokenizing ----------------
+def tokenize(text: str | None) -> list[str]:
+    if not text:
+        return []
+    return [t for t in TOKEN_RE.findall(text.lower()) if len(t) >= MIN_TOKEN_LEN]
+
+
+def build_search_tokens(title: str, description: str, category: str) -> list[str]:
+    """Unique lowercase tokens stored on each property as `search_tokens`.
+
+    The field carries a multikey index, so exact-token and anchored-prefix
+    lookups are index range scans instead of a collection-wide regex.
+    """
+    seen = []
+    for token in tokenize(title) + tokenize(category) + tokenize(description):
+        if token not in seen:
+            seen.append(token)
+        if len(seen) >= MAX_TOKENS_PER_DOC:
+            break
+    return seen
+
+
+def search_filter(q: str) -> dict:
+    """Filter for type-ahead style matching: every whole word must match a
+    token, the last (possibly partial) word matches as a prefix."""
+    tokens = tokenize(q)
+    if not tokens:
+        return {}
+    # a trailing space means the user has finished the last word
+    if q[-1:].isspace():
+        complete, last = tokens, None
+    else:
+        complete, last = tokens[:-1], tokens[-1]
+
+    clauses = []
+    if complete:
+        clauses.append({"search_tokens": {"$all": complete}})
+    if last:
+        clauses.append({"search_tokens": {"$regex": f"^{re.escape(last)}"}})
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+# ---------------- Ranked full-text search ----------------
+@router.get("/search")
+def search_properties(
+    q: str = Query(..., min_length=1),
+    category: str = None,
+    cursor: str = None,
+    limit: int = Query(DEFAULT_LIMIT, ge=1),
+    fields: str = "card",
+):
+    """Relevance-ranked search over title, category and description."""
+    limit = clamp_limit(limit)
+    match = {"$text": {"$search": q}}
+    if category:
+        match["category"] = category.lower()
+
+    pipeline = [
+        {"$match": match},
+        {"$addFields": {"score": {"$meta": "textScore"}}},
+    ]
+    if cursor:
+        score, oid = decode_cursor(cursor, "num", nullable=False)
+        pipeline.append({"$match": {"$or": [
+            {"score": {"$lt": score}},
+            {"score": score, "_id": {"$lt": oid}},
+        ]}})
+    pipeline += [
+        {"$sort": {"score": -1, "_id": -1}},
+        {"$limit": limit + 1},
+    ]
+    projection = resolve_projection(fields, "score")
+    pipeline.append({"$project": pipeline_projection(projection)})
+
+    docs = list(db.properties.aggregate(pipeline))
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1]["score"], docs[-1]["_id"])
+    return MongoJSONResponse({"items": docs, "next": next_cursor})
+
+
+# ---------------- Type-ahead suggestions ----------------
+@router.get("/search/suggest")
+def suggest_properties(q: str = Query(..., min_length=1), limit: int = Query(8, ge=1, le=20)):
+    """Prefix matches for the search box, newest first."""
+    query = search_filter(q)
+    if not query:
+        raise HTTPException(status_code=400, detail="Query too short")
+    docs = list(
+        db.properties.find(query, {"title": 1, "category": 1, "price": 1})
+        .sort([("created_at", -1), ("_id", -1)])
+        .limit(limit)
+    )
+    return MongoJSONResponse({"items": docs})
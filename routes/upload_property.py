@@ -1,16 +1,16 @@
 from fastapi import APIRouter, HTTPException, UploadFile, Form, Depends
 from routes.auth import get_current_user
 from database import db
-import cloudinary.uploader
-from cloudinary_config import *
+from image_pipeline import store_images
 from datetime import datetime
+from routes.search import build_search_tokens
 
 router = APIRouter()
 
 VALID_CATEGORIES = ["house", "villa", "apartment", "farmlands", "plots", "buildings"]
 
 @router.post("/upload-property")
-async def upload_property(
+def upload_property(
     title: str = Form(...),
     description: str = Form(...),
     price: float = Form(...),
@@ -31,14 +31,9 @@ async def upload_property(
         image_url = None
         if image:
             try:
-                upload_result = cloudinary.uploader.upload(
-                    image.file,
-                    folder="real-estate-app",
-                    resource_type="auto"
-                )
-                image_url = upload_result.get("secure_url")
+                image_url = store_images([(image.file, image.filename)])[0]["full"]
             except Exception as e:
-                raise HTTPException(status_code=500, detail=f"Cloudinary upload failed: {str(e)}")
+                raise HTTPException(status_code=500, detail=f"Image upload failed: {str(e)}")
 
         property_data = {
             "title": title,
@@ -53,7 +48,8 @@ async def upload_property(
             "created_at": datetime.utcnow()
         }
 
-        result = db.properties.insert_one(property_data)
+        search_tokens = build_search_tokens(title, description, category)
+        result = db.properties.insert_one({**property_data, "search_tokens": search_tokens})
         property_data["_id"] = str(result.inserted_id)
 
         return {"message": "Property added successfully", "property": property_data}
@@ -1,70 +1,55 @@
 from fastapi import APIRouter, Depends, HTTPException
-from pymongo import MongoClient
 from routes.dependencies import get_current_user  # 👈 fix import
-import os
+from database import async_db
+from routes.messages import mark_read
 from bson import ObjectId
 
 router = APIRouter()
 
-MONGO_URI = os.getenv("MONGO_URI")
-client = MongoClient(MONGO_URI)
-db = client.real_estate
-chats_collection = db.chats
+# Uses the app's shared client and database; unread counts come from the
+# per-member counters maintained in routes/messages.py.
 
 # ---------------- Unread chat notifications ----------------
 @router.get("/notifications")
-def get_unread_chats(current_user: dict = Depends(get_current_user)):
-    owner_id = current_user.get("email")
-    if not owner_id:
+async def get_unread_chats(current_user: dict = Depends(get_current_user)):
+    user_email = current_user.get("email")
+    if not user_email:
         raise HTTPException(status_code=400, detail="User email not found in token")
 
-    chats = chats_collection.find(
-        {
-            "property_owner": owner_id,
-            "messages": {"$elemMatch": {"read": False}}
-        },
-        {"chat_id": 1, "property_id": 1, "messages": 1}
-    )
-
-    result = []
-    for chat in chats:
-        messages = chat.get("messages", [])
-        unread_count = sum(1 for m in messages if not m.get("read", True))
-
-        if unread_count > 0:
-            result.append({
-                "chat_id": str(chat.get("chat_id") or chat.get("_id")),
-                "property_id": chat.get("property_id"),
-                "unread_count": unread_count
-            })
-
+    chats = await async_db.chats.aggregate([
+        {"$match": {"members": {"$elemMatch": {"email": user_email, "unread": {"$gt": 0}}}}},
+        {"$sort": {"updated_at": -1, "_id": -1}},
+        {"$project": {
+            "propertyId": 1,
+            "me": {"$arrayElemAt": [
+                {"$filter": {"input": "$members", "cond": {"$eq": ["$$this.email", user_email]}}},
+                0,
+            ]},
+        }},
+    ]).to_list(length=None)
+
+    result = [
+        {"chat_id": str(chat["_id"]), "property_id": chat.get("propertyId"), "unread_count": chat["me"]["unread"]}
+        for chat in chats
+    ]
     return {"notifications": result}
 
 
 # ---------------- Mark messages as read ----------------
 
 @router.post("/mark-read/{chat_id}")
-def mark_messages_as_read(chat_id: str, current_user: dict = Depends(get_current_user)):
-    owner_id = current_user.get("email")
-    if not owner_id:
+async def mark_messages_as_read(chat_id: str, current_user: dict = Depends(get_current_user)):
+    user_email = current_user.get("email")
+    if not user_email:
         raise HTTPException(status_code=400, detail="User email not found")
+    if not ObjectId.is_valid(chat_id):
+        raise HTTPException(status_code=400, detail="Invalid chat ID")
 
-    # Try both: custom chat_id or Mongo _id
-    query = {
-        "$or": [
-            {"chat_id": chat_id},
-            {"_id": ObjectId(chat_id)} if ObjectId.is_valid(chat_id) else {}
-        ],
-        "property_owner": owner_id
-    }
-
-    result = chats_collection.update_one(
-        query,
-        {"$set": {"messages.$[elem].read": True}},
-        array_filters=[{"elem.read": False, "elem.sender": {"$ne": owner_id}}]
+    chat = await async_db.chats.find_one(
+        {"_id": ObjectId(chat_id), "members.email": user_email}, {"_id": 1}
     )
+    if not chat:
+        raise HTTPException(status_code=404, detail="Chat not found")
 
-    if result.modified_count == 0:
-        raise HTTPException(status_code=404, detail="No unread messages found for this chat")
-
+    await mark_read(chat["_id"], user_email)
     return {"status": "ok"}
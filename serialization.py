@@ -0,0 +1,64 @@
+# serialization.py
+# One JSON path for Mongo documents. orjson renders dicts/lists/datetimes in C
+# and calls _default only for BSON types, so raw find()/aggregate() results can
+# be returned as-is: no per-document `_id = str(...)` loop and no
+# jsonable_encoder walk.
+#
+# Routes that return a dict still go through FastAPI's jsonable_encoder; the
+# listing endpoints return MongoJSONResponse(...) directly to skip it.
+from decimal import Decimal
+import orjson
+from bson import ObjectId, Decimal128
+from fastapi import Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+NDJSON_CHUNK_DOCS = 100  # documents per chunk written to the socket
+
+
+def _default(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, Decimal128):
+        return float(obj.to_decimal())
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class MongoJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+# ---------------- NDJSON ----------------
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def iter_ndjson(docs, chunk_docs: int = NDJSON_CHUNK_DOCS):
+    """One JSON document per line, `chunk_docs` lines per yielded chunk.
+
+    `docs` is consumed lazily, so a pymongo cursor streams batch by batch and
+    the full result set is never held in memory.
+    """
+    lines = []
+    for doc in docs:
+        lines.append(dumps(doc))
+        if len(lines) >= chunk_docs:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+    if lines:
+        yield b"\n".join(lines) + b"\n"
+
+
+def ndjson_response(docs, headers: dict | None = None) -> StreamingResponse:
+    # a sync generator: Starlette pulls each chunk in the threadpool, so
+    # blocking cursor reads never run on the event loop
+    return StreamingResponse(iter_ndjson(docs), media_type=NDJSON_MEDIA_TYPE, headers=headers)
@@ -0,0 +1,110 @@
+# storage.py
+# Where listing images are kept.
+#   STORAGE_BACKEND=cloudinary (default) - production, needs CLOUDINARY_* vars
+#   STORAGE_BACKEND=local                - files under UPLOAD_DIR, served by the app
+import os
+import shutil
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from metrics import timed
+
+load_dotenv()
+
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", 4))
+CLOUDINARY_FOLDER = "real-estate-app"
+CLOUDINARY_DELETE_BATCH = 100  # Admin API limit per delete_resources call
+
+
+class CloudinaryStorage:
+    def __init__(self):
+        self._uploader = None
+
+    def _get_uploader(self):
+        # configured on first upload, so importing the app needs no Cloudinary credentials
+        if self._uploader is None:
+            import cloudinary_config  # noqa: F401  (configures the SDK, raises if env is missing)
+            import cloudinary.uploader
+            self._uploader = cloudinary.uploader
+        return self._uploader
+
+    def save(self, fileobj, filename: str | None = None) -> str:
+        uploader = self._get_uploader()
+        with timed("cloudinary"):
+            result = uploader.upload(fileobj, folder=CLOUDINARY_FOLDER, resource_type="auto")
+        return result.get("secure_url")
+
+    @staticmethod
+    def _public_id(url: str) -> tuple[str, str] | None:
+        """(resource_type, public_id) for a URL this app uploaded, else None.
+        .../<resource_type>/upload/[v123/]real-estate-app/<name>.<ext>"""
+        prefix, sep, rest = url.partition("/upload/")
+        if not sep:
+            return None
+        parts = rest.split("/")
+        if CLOUDINARY_FOLDER not in parts:
+            return None
+        resource_type = prefix.rsplit("/", 1)[-1]
+        public_id = "/".join(parts[parts.index(CLOUDINARY_FOLDER):])
+        if resource_type != "raw":
+            public_id = os.path.splitext(public_id)[0]
+        return resource_type, public_id
+
+    def delete(self, urls: list[str]) -> int:
+        """Remove uploaded assets; unknown or already-deleted ones are skipped."""
+        by_type: dict[str, list[str]] = {}
+        for url in urls:
+            parsed = self._public_id(url)
+            if parsed:
+                by_type.setdefault(parsed[0], []).append(parsed[1])
+        if not by_type:
+            return 0
+        self._get_uploader()
+        import cloudinary.api
+        deleted = 0
+        for resource_type, public_ids in by_type.items():
+            for i in range(0, len(public_ids), CLOUDINARY_DELETE_BATCH):
+                batch = public_ids[i:i + CLOUDINARY_DELETE_BATCH]
+                with timed("cloudinary"):
+                    result = cloudinary.api.delete_resources(batch, resource_type=resource_type)
+                deleted += sum(1 for status in result.get("deleted", {}).values() if status == "deleted")
+        return deleted
+
+
+class LocalStorage:
+    def __init__(self, directory: str, base_url: str):
+        self.directory = directory
+        self.base_url = base_url.rstrip("/")
+        os.makedirs(directory, exist_ok=True)
+
+    def save(self, fileobj, filename: str | None = None) -> str:
+        ext = os.path.splitext(filename or "")[1].lower()
+        name = f"{uuid.uuid4().hex}{ext}"
+        with open(os.path.join(self.directory, name), "wb") as out:
+            shutil.copyfileobj(fileobj, out)
+        return f"{self.base_url}/{name}"
+
+    def delete(self, urls: list[str]) -> int:
+        deleted = 0
+        for url in urls:
+            if not url.startswith(self.base_url + "/"):
+                continue
+            try:
+                os.remove(os.path.join(self.directory, os.path.basename(url)))
+                deleted += 1
+            except FileNotFoundError:
+                pass
+        return deleted
+
+
+def _make_storage():
+    if os.getenv("STORAGE_BACKEND", "cloudinary") == "local":
+        return LocalStorage(os.getenv("UPLOAD_DIR", "uploads"), os.getenv("UPLOAD_BASE_URL", "/uploads"))
+    return CloudinaryStorage()
+
+
+storage = _make_storage()
+
+# bounded pool shared by every request, so a burst of listings can't open
+# unlimited concurrent uploads
+upload_pool = ThreadPoolExecutor(max_workers=UPLOAD_CONCURRENCY, thread_name_prefix="upload")
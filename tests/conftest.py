@@ -0,0 +1,6 @@
+# tests/conftest.py
+# Modules live at the repo root, so make them importable however pytest is run.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,79 @@
+# tests/test_location.py
+# Geocoder proxy: caching, coalescing and rate limiting, against a fake
+# upstream (httpx.MockTransport) so no request leaves the process.
+import asyncio
+import time
+import httpx
+import pytest
+from routes import location
+
+
+class FakeGeocoder:
+    def __init__(self, status: int = 200, delay: float = 0.0):
+        self.status = status
+        self.delay = delay
+        self.calls = []
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls.append((time.monotonic(), request.url.params["q"]))
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.status != 200:
+            return httpx.Response(self.status, request=request)
+        return httpx.Response(200, json=[{"display_name": request.url.params["q"]}], request=request)
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    fake = FakeGeocoder()
+    location.geocode_cache.clear()
+    location._inflight.clear()
+    monkeypatch.setattr(location, "_client", httpx.AsyncClient(transport=httpx.MockTransport(fake)))
+    monkeypatch.setattr(location, "upstream_limiter", location._RateLimiter(0))
+    yield fake
+    location.geocode_cache.clear()
+
+
+def test_normalized_queries_share_a_cache_entry(upstream):
+    async def lookups():
+        return [await location.geocode(q) for q in ("Paris", "  paris ", "PARIS")]
+
+    results = asyncio.run(lookups())
+    assert results == [[{"display_name": "paris"}]] * 3
+    assert [q for _, q in upstream.calls] == ["paris"]
+
+
+def test_concurrent_identical_lookups_coalesce(upstream):
+    upstream.delay = 0.05
+
+    async def lookups():
+        return await asyncio.gather(*[location.geocode(q) for q in ("Berlin", "berlin", " BERLIN")])
+
+    results = asyncio.run(lookups())
+    assert all(r == [{"display_name": "berlin"}] for r in results)
+    assert len(upstream.calls) == 1
+    assert not location._inflight
+
+
+def test_upstream_calls_are_spaced(upstream, monkeypatch):
+    monkeypatch.setattr(location, "upstream_limiter", location._RateLimiter(0.1))
+
+    async def lookups():
+        await asyncio.gather(*[location.geocode(q) for q in ("a", "b", "c")])
+
+    asyncio.run(lookups())
+    times = sorted(t for t, _ in upstream.calls)
+    assert len(times) == 3
+    assert all(later - earlier >= 0.09 for earlier, later in zip(times, times[1:]))
+
+
+def test_http_errors_are_not_cached(upstream):
+    upstream.status = 503
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(location.geocode("Rome"))
+    assert location.geocode_cache.get("rome") is None
+
+    upstream.status = 200
+    assert asyncio.run(location.geocode("Rome")) == [{"display_name": "rome"}]
+    assert len(upstream.calls) == 2